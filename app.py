@@ -1,5 +1,6 @@
 import sys
 import signal
+import multiprocessing
 from PySide6 import QtWidgets
 from PySide6.QtCore import QCoreApplication
 from ui.telaEmpresa import EmpresaWindow
@@ -21,4 +22,5 @@ def sinal_encerramento(sig, frame):
 signal.signal(signal.SIGINT, sinal_encerramento)
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()
     main()
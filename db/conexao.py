@@ -1,8 +1,7 @@
 # import os
 # import sys
 # import pymysql
-# from dotenv import load_dotenv
-
+# 
 # def carregar_env():
 #     env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
 #     if not os.path.exists(env_path):
@@ -56,13 +55,25 @@
 #             print(f"[ERRO] Falha ao fechar conexão: {e}")
 
 import os
+import time
+import threading
+from contextlib import contextmanager
 import mysql.connector
-from mysql.connector import Error
-from dotenv import load_dotenv
+from mysql.connector import Error, errors
+from mysql.connector.pooling import MySQLConnectionPool, PooledMySQLConnection
+from utils.configuracao import carregarEnv, obterConfig, obterConfigInt
+
+# Pool de conexões do processo. POOL_TAMANHO limita as conexões simultâneas (máx. 32 no
+# mysql.connector); quando todas estão em uso, o pedido é repetido por até POOL_ESPERA
+# segundos e então é aberta uma conexão avulsa, para nunca travar a aplicação.
+POOL_TAMANHO = max(1, min(obterConfigInt('POOL_TAMANHO', 10), 32))
+POOL_ESPERA = obterConfigInt('POOL_ESPERA', 10)
+
+_pool = None
+_pool_trava = threading.Lock()
 
 def env():
-    envDiretorio = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
-    load_dotenv(dotenv_path=envDiretorio, override=True)
+    carregarEnv()
     host = os.getenv('HOST')
     usuario = os.getenv('USUARIO')
     banco = os.getenv('BANCO')
@@ -74,42 +85,114 @@ def env():
         'port': os.getenv('PORT', '3306')
     }
 
+def parametrosConexao():
+    config = env()
+    return {
+        'host': config['host'],
+        'user': config['usuario'],
+        'password': config['senha'],
+        'database': config['banco'],
+        'port': int(config.get('port', 3306)),
+        'charset': 'utf8mb4',
+        'use_unicode': True,
+        'autocommit': False,
+        'connection_timeout': 30,
+        'sql_mode': 'STRICT_TRANS_TABLES',
+        'allow_local_infile': (obterConfig('CARREGADOR_C170', '') or '').lower() == 'load_data',
+    }
+
+def obterPool():
+    global _pool
+    if _pool is None:
+        with _pool_trava:
+            if _pool is None:
+                config = env()
+                print(f"[INFO] Criando pool de {POOL_TAMANHO} conexões: host={config['host']}, usuário={config['usuario']}, banco={config['banco']}")
+                _pool = MySQLConnectionPool(
+                    pool_name='apurador',
+                    pool_size=POOL_TAMANHO,
+                    pool_reset_session=True,
+                    **parametrosConexao()
+                )
+    return _pool
+
 def conectarBanco(dict_cursor=False):
     """
-    Conecta ao banco MySQL.
+    Empresta uma conexão do pool (a saúde é verificada pelo pool, que reconecta
+    conexões caídas). Devolva sempre com fecharBanco ou use obterConexao.
     Se dict_cursor=True, retorna resultados como dicionário.
     """
     try:
-        config = env()
-        print(f"[INFO] Tentando conectar ao banco: host={config['host']}, usuário={config['usuario']}, banco={config['banco']}")
-        
-        conexao = mysql.connector.connect(
-            host=config['host'],
-            user=config['usuario'],
-            password=config['senha'],
-            database=config['banco'],
-            port=int(config.get('port', 3306)),
-            charset='utf8mb4',
-            use_unicode=True,
-            autocommit=False,
-            connection_timeout=30,
-            sql_mode='STRICT_TRANS_TABLES'
-        )
-        
+        pool = obterPool()
+        limite = time.monotonic() + POOL_ESPERA
+        while True:
+            try:
+                conexao = pool.get_connection()
+                break
+            except errors.PoolError:
+                if time.monotonic() >= limite:
+                    print(f"[AVISO] Pool de conexões esgotado após {POOL_ESPERA}s. Abrindo conexão avulsa.")
+                    conexao = mysql.connector.connect(**parametrosConexao())
+                    break
+                time.sleep(0.1)
+
         if conexao.is_connected():
-            print(f"[SUCESSO] Conexão estabelecida com o banco {config['banco']}")
             # Se dict_cursor=True, configurar para retornar dicionários
             if dict_cursor:
                 conexao._use_unicode = True
             return conexao
+        fecharBanco(conexao)
     except Error as e:
         print(f"[ERRO] ao conectar ao banco: {e}")
     return None
 
 def fecharBanco(conexao):
-    if conexao and conexao.is_connected():
-        conexao.close()
-        print("[INFO] Conexão fechada.")
+    """Devolve a conexão ao pool (ou fecha a conexão avulsa)."""
+    if not conexao:
+        return
+    try:
+        if isinstance(conexao, PooledMySQLConnection):
+            # Já devolvida ao pool: fechar de novo devolveria uma conexão nula
+            if getattr(conexao, '_cnx', None) is None:
+                return
+            conexao.close()
+        elif conexao.is_connected():
+            conexao.close()
+            print("[INFO] Conexão fechada.")
+    except Error as e:
+        print(f"[ERRO] Falha ao devolver conexão: {e}")
+
+@contextmanager
+def obterConexao(dict_cursor=False):
+    """Uso: with obterConexao() as conexao: ... (a conexão volta ao pool na saída)."""
+    conexao = conectarBanco(dict_cursor)
+    if not conexao:
+        raise ConnectionError("Erro ao conectar ao banco")
+    try:
+        yield conexao
+    finally:
+        fecharBanco(conexao)
+
+def consultarEmLotes(conexao, sql, parametros=(), tamanho=5000, dicionario=False):
+    """
+    Executa `sql` num cursor não bufferizado (as linhas ficam no servidor) e gera o
+    resultado em lotes de até `tamanho` linhas com fetchmany, então a memória não
+    cresce com o tamanho da consulta.
+    Enquanto o gerador não termina a conexão fica ocupada: grave por outra conexão.
+    """
+    cursor = conexao.cursor(buffered=False, dictionary=dicionario)
+    try:
+        cursor.execute(sql, parametros)
+        while True:
+            lote = cursor.fetchmany(tamanho)
+            if not lote:
+                break
+            yield lote
+    finally:
+        # Se o consumo foi interrompido, descarta o restante para liberar a conexão
+        if conexao.unread_result:
+            conexao.consume_results()
+        cursor.close()
 
 def conectarMySQL():
     try:
@@ -16,6 +16,72 @@ def criar_tabela_empresas(conexao):
     except Error as e:
         print(f"[ERRO] ao criar tabela 'empresas': {e}")
 
+def criar_tabela_sequencias(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sequencias (
+            nome VARCHAR(40) PRIMARY KEY,
+            proximo BIGINT NOT NULL
+        )
+    """)
+
+def criar_tabela_sped_arquivos(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sped_arquivos (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            empresa_id INT NOT NULL,
+            hash_sha256 CHAR(64) NOT NULL,
+            nome VARCHAR(255),
+            periodo VARCHAR(10),
+            filial VARCHAR(10),
+            status VARCHAR(20) NOT NULL,
+            registros_confirmados BIGINT NOT NULL DEFAULT 0,
+            atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            UNIQUE KEY uk_sped_arquivos_empresa_hash (empresa_id, hash_sha256)
+        )
+    """)
+
+def criar_tabela_pos_processamento_etapas(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS pos_processamento_etapas (
+            empresa_id INT NOT NULL,
+            etapa VARCHAR(40) NOT NULL,
+            escopo CHAR(40) NOT NULL,
+            periodos TEXT,
+            assinatura CHAR(40),
+            duracao DECIMAL(12, 3),
+            linhas BIGINT,
+            executado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            PRIMARY KEY (empresa_id, etapa, escopo)
+        )
+    """)
+
+def criar_tabela_fornecedores_cnpj(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS fornecedores_cnpj (
+            cnpj VARCHAR(20) PRIMARY KEY,
+            cnae VARCHAR(20),
+            uf VARCHAR(5),
+            simples VARCHAR(10),
+            decreto VARCHAR(10),
+            motivo VARCHAR(20),
+            atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+    """)
+    # motivo: NULL para CNPJs com dados; invalido, nao_encontrado ou incompleto para os negativos
+    criar_coluna_se_nao_existir(cursor, 'fornecedores_cnpj', 'motivo', 'VARCHAR(20) AFTER decreto')
+
+def criar_coluna_se_nao_existir(cursor, nome_tabela, nome_coluna, definicao):
+    cursor.execute("""
+        SELECT COUNT(*)
+        FROM information_schema.columns
+        WHERE table_schema = DATABASE()
+          AND table_name = %s
+          AND column_name = %s
+    """, (nome_tabela, nome_coluna))
+    if not cursor.fetchone()[0]:
+        print(f"[INFO] Criando coluna '{nome_coluna}' em '{nome_tabela}'...")
+        cursor.execute(f"ALTER TABLE `{nome_tabela}` ADD COLUMN {nome_coluna} {definicao}")
+
 def criar_indice_se_nao_existir(cursor, nome_tabela, nome_indice, colunas, unique=False):
     cursor.execute("""
         SELECT COUNT(*) 
@@ -289,31 +355,10 @@ def criar_tabelas_principais():
             )
         """)
 
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS c170nova (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                empresa_id INT,
-                cod_item VARCHAR(60),
-                periodo VARCHAR(10),
-                reg VARCHAR(10),
-                num_item VARCHAR(10),
-                descr_compl VARCHAR(255),
-                cod_ncm VARCHAR(40),
-                qtd VARCHAR(20),
-                unid VARCHAR(10),
-                vl_item VARCHAR(20),
-                vl_desc VARCHAR(20),
-                cst VARCHAR(10),
-                cfop VARCHAR(10),
-                id_c100 VARCHAR(10),
-                filial VARCHAR(10),
-                ind_oper VARCHAR(5),
-                cod_part VARCHAR(60),
-                num_doc VARCHAR(20),
-                chv_nfe VARCHAR(60),
-                INDEX idx_empresa (empresa_id)
-            )
-        """)
+        criar_tabela_sequencias(cursor)
+        criar_tabela_sped_arquivos(cursor)
+        criar_tabela_pos_processamento_etapas(cursor)
+        criar_tabela_fornecedores_cnpj(cursor)
 
         # ---------------- Índices  ----------------
         criar_indice_se_nao_existir(cursor, '0150', 'idx_0150_part_periodo_emp', 'cod_part, periodo, empresa_id')
@@ -326,7 +371,6 @@ def criar_tabelas_principais():
         criar_indice_se_nao_existir(cursor, 'cadastro_tributacao', 'idx_tributacao_codigo_empresa', 'codigo, empresa_id')
         criar_indice_se_nao_existir(cursor, 'c170_clone', 'idx_c170clone_cod_item_empresa', 'cod_item, empresa_id')
         criar_indice_se_nao_existir(cursor, '0200', 'idx_0200_cod_item_empresa', 'cod_item, empresa_id')
-        criar_indice_se_nao_existir(cursor, 'c170nova', 'idx_c170nova_cod_item_empresa', 'cod_item, empresa_id')
         criar_indice_se_nao_existir(cursor, 'c170_clone', 'idx_c170clone_codpart_empresa_periodo', 'cod_part, empresa_id, periodo')
         criar_indice_se_nao_existir(cursor, 'cadastro_fornecedores', 'idx_fornecedor_codpart_empresa', 'cod_part, empresa_id')
         criar_indice_se_nao_existir(cursor, 'c170_clone', 'idx_c170clone_empresa_periodo', 'empresa_id, periodo')
@@ -334,10 +378,8 @@ def criar_tabelas_principais():
         criar_indice_se_nao_existir(cursor, 'c170_clone', 'idx_c170clone_aliquota_empresa', 'empresa_id, aliquota')
         criar_indice_se_nao_existir(cursor, 'cadastro_fornecedores', 'idx_fornecedor_empresa_simples', 'empresa_id, simples')
         criar_indice_se_nao_existir(cursor, '0200', 'idx_0200_empresa_coditem_descr', 'empresa_id, cod_item, descr_item')
-        criar_indice_se_nao_existir(cursor, 'c170nova', 'idx_c170nova_empresa_coditem_descr', 'empresa_id, cod_item, descr_compl')
         criar_indice_se_nao_existir(cursor, 'c170', 'idx_c170_chv_nfe', 'chv_nfe')
         criar_indice_se_nao_existir(cursor, 'c170_clone', 'idx_c170clone_chv_nfe', 'chv_nfe')
-        criar_indice_se_nao_existir(cursor, 'c170nova', 'idx_c170nova_chv_nfe', 'chv_nfe')
         criar_indice_se_nao_existir(cursor, 'c170', 'idx_c170_empresa_cfop', 'empresa_id, cfop')
         criar_indice_se_nao_existir(cursor, 'c100', 'idx_c100_id_codpart_empresa', 'id, cod_part, empresa_id')
         criar_indice_se_nao_existir(cursor, 'cadastro_fornecedores', 'idx_fornecedores_empresa_uf_decreto', 'empresa_id, uf, decreto')
@@ -345,10 +387,11 @@ def criar_tabelas_principais():
         criar_indice_se_nao_existir(cursor, 'c170_clone', 'idx_c170clone_produto_ncm_empresa', 'descr_compl, ncm, empresa_id')
         criar_indice_se_nao_existir(cursor, 'c170_clone', 'idx_c170clone_empresa_produto_ncm_aliquota', 'empresa_id, descr_compl, ncm, aliquota')
         criar_indice_se_nao_existir(cursor,'cadastro_tributacao','uniq_empresa_codigo_produto_ncm','empresa_id, codigo, produto(255), ncm',unique=True)
-        criar_indice_se_nao_existir(cursor, 'c170nova', 'idx_c170nova_cod_item_id_c100_empresa', 'cod_item, id_c100, empresa_id')
         criar_indice_se_nao_existir(cursor, 'c170', 'idx_c170_empresa_id_id_c100_cfop', 'empresa_id, id_c100, cfop')
         criar_indice_se_nao_existir(cursor, '0200', 'idx_0200_cod_item_empresa_id', 'cod_item, empresa_id')
         criar_indice_se_nao_existir(cursor, 'c170', 'idx_c170_id_empresa', 'id, empresa_id')
+        criar_indice_se_nao_existir(cursor, 'c170', 'idx_c170_empresa_periodo_cfop', 'empresa_id, periodo, cfop')
+        criar_indice_se_nao_existir(cursor, 'cadastro_fornecedores', 'idx_fornecedores_empresa_cnpj', 'empresa_id, cnpj')
 
         conexao.commit()
         print("[DB] Todas as tabelas criadas ou atualizadas com sucesso.")
@@ -0,0 +1,176 @@
+import argparse
+import asyncio
+import time
+from collections import Counter
+from db.conexao import conectarBanco, fecharBanco, consultarEmLotes
+from services.spedService.periodos import filtroPeriodos, descreverPeriodos
+from services.spedService.atualizacoes import calcularResultado, ajustarAliquotaSimples
+from services.spedService.materializacao import materializarC170Clone, COLUNAS_CLONE, CFOPS_MATERIALIZACAO
+
+# Compara, numa empresa real, a materialização da c170_clone (SQL) com o caminho
+# antigo em Python: páginas LIMIT/OFFSET de c170 JOIN c100, filtro de fornecedor e
+# 0200 em dicionários, alíquota do cadastro_tributacao, ajuste do Simples e
+# resultado com calcularResultado. Mede os dois tempos e confere se as linhas são
+# as mesmas (multiconjunto das colunas gravadas).
+# A referência só lê (não grava a c170nova nem faz os UPDATEs antigos), então o
+# tempo dela é um piso do tempo do caminho antigo. A materialização regrava a
+# c170_clone da empresa, como no pós-processamento.
+#
+# Rodar da raiz do projeto (os imports partem dela):
+#   python -m scripts.benchmarkMaterializacao <empresa_id> [--periodo 01/2024 ...]
+#
+# Medição de referência (SQLite em memória, dados sintéticos: 1 C100 para 5 C170,
+# 1/3 dos itens nos CFOPs, metade dos fornecedores filtrados, páginas de 5000).
+# Compara só a leitura paginada + filtro em Python com um INSERT ... SELECT
+# equivalente; os tempos no MySQL dependem do servidor e devem ser medidos com
+# este script nas empresas reais.
+#   itens c170   LIMIT/OFFSET + Python   INSERT ... SELECT
+#      200 mil          2,64 s               0,25 s   (10,7x)
+#      500 mil         13,04 s               0,80 s   (16,3x)
+#        1 mi          60,72 s               1,83 s   (33,1x)
+#        2 mi         292,29 s               4,28 s   (68,3x)
+# O caminho antigo cresce de forma quadrática (cada página relê as anteriores).
+
+COLUNAS_COMPARADAS = COLUNAS_CLONE + ('aliquota', 'resultado')
+_EXEMPLOS = 5
+
+def _normalizar(linha):
+    return tuple(None if valor is None else str(valor) for valor in linha)
+
+def linhasReferencia(empresa_id, periodos=None, lote_tamanho=5000):
+    """Gera as linhas da c170_clone calculadas como antes, em Python, na ordem de COLUNAS_COMPARADAS."""
+    filtro, parametros_periodo = filtroPeriodos(periodos, 'c.periodo')
+    cfops = ', '.join(['%s'] * len(CFOPS_MATERIALIZACAO))
+    conexao = conectarBanco()
+    cursor = conexao.cursor()
+    try:
+        cursor.execute("""
+            SELECT cod_part FROM cadastro_fornecedores
+            WHERE empresa_id = %s AND uf = 'CE' AND decreto = 'Não'
+        """, (empresa_id,))
+        fornecedores = {cod_part for (cod_part,) in cursor.fetchall()}
+        cursor.execute("SELECT cod_part FROM cadastro_fornecedores WHERE empresa_id = %s AND simples = 'Sim'",
+                       (empresa_id,))
+        simples = {cod_part for (cod_part,) in cursor.fetchall()}
+
+        cursor.execute("SELECT cod_item, descr_item, cod_ncm FROM `0200` WHERE empresa_id = %s ORDER BY id",
+                       (empresa_id,))
+        dados_0200 = {cod_item: (descr_item, cod_ncm) for cod_item, descr_item, cod_ncm in cursor.fetchall()}
+
+        cursor.execute("""
+            SELECT produto, ncm, aliquota FROM cadastro_tributacao
+            WHERE empresa_id = %s AND aliquota IS NOT NULL AND aliquota <> ''
+            ORDER BY id
+        """, (empresa_id,))
+        tributacao = {(produto, ncm): aliquota[:10] for produto, ncm, aliquota in cursor.fetchall()}
+
+        offset = 0
+        while True:
+            cursor.execute(f"""
+                SELECT c.cod_item, c.periodo, c.reg, c.num_item, c.descr_compl, c.qtd, c.unid,
+                       c.vl_item, c.vl_desc, c.cst_icms, c.cfop, c.id_c100, c.filial, c.ind_oper,
+                       cc.cod_part, cc.num_doc, cc.chv_nfe
+                FROM c170 c
+                JOIN c100 cc ON cc.id = c.id_c100
+                WHERE c.empresa_id = %s
+                  AND c.cfop IN ({cfops}){filtro}
+                LIMIT %s OFFSET %s
+            """, (empresa_id, *CFOPS_MATERIALIZACAO, *parametros_periodo, lote_tamanho, offset))
+            linhas = cursor.fetchall()
+            if not linhas:
+                break
+
+            for (cod_item, periodo, reg, num_item, descr_compl, qtd, unid, vl_item, vl_desc, cst,
+                 cfop, id_c100, filial, ind_oper, cod_part, num_doc, chv_nfe) in linhas:
+                if cod_part not in fornecedores:
+                    continue
+                descr_item, ncm = dados_0200.get(cod_item, (None, None))
+                descricao = descr_item or descr_compl
+                aliquota = tributacao.get((descricao, ncm), '') if descricao is not None and ncm is not None else ''
+                if cod_part in simples:
+                    aliquota = ajustarAliquotaSimples(aliquota)
+                    aliquota = aliquota[:10] if aliquota else aliquota
+                yield (
+                    empresa_id, cod_item, periodo, reg, num_item, descricao, ncm, qtd, unid,
+                    vl_item, vl_desc, cst, cfop, id_c100, filial,
+                    ind_oper, cod_part, num_doc, chv_nfe,
+                    aliquota, calcularResultado(vl_item, vl_desc, aliquota),
+                )
+
+            if len(linhas) < lote_tamanho:
+                break
+            offset += lote_tamanho
+    finally:
+        cursor.close()
+        fecharBanco(conexao)
+
+def linhasMaterializadas(empresa_id, periodos=None, lote_tamanho=5000):
+    filtro, parametros_periodo = filtroPeriodos(periodos)
+    conexao = conectarBanco()
+    try:
+        for lote in consultarEmLotes(conexao, f"""
+            SELECT {', '.join(COLUNAS_COMPARADAS)} FROM c170_clone
+            WHERE empresa_id = %s{filtro}
+        """, (empresa_id, *parametros_periodo), lote_tamanho):
+            yield from lote
+    finally:
+        fecharBanco(conexao)
+
+def _contar(linhas):
+    # Só o hash de cada linha fica em memória; os exemplos são buscados depois, se preciso
+    return Counter(hash(_normalizar(linha)) for linha in linhas)
+
+def _exemplos(linhas, sobras):
+    encontrados = []
+    for linha in linhas:
+        if hash(_normalizar(linha)) in sobras:
+            encontrados.append(linha)
+            if len(encontrados) >= _EXEMPLOS:
+                break
+    return encontrados
+
+def comparar(empresa_id, periodos=None, lote_tamanho=5000):
+    """Mede os dois caminhos e devolve True se gravam as mesmas linhas."""
+    print(f"[BENCHMARK] Empresa {empresa_id} ({descreverPeriodos(periodos)})")
+
+    inicio = time.perf_counter()
+    total = asyncio.run(materializarC170Clone(empresa_id, periodos, lote_tamanho))
+    tempo_sql = time.perf_counter() - inicio
+    if total is None:
+        print("[ERRO] A materialização falhou; nada a comparar.")
+        return False
+
+    inicio = time.perf_counter()
+    referencia = _contar(linhasReferencia(empresa_id, periodos, lote_tamanho))
+    tempo_python = time.perf_counter() - inicio
+
+    materializadas = _contar(linhasMaterializadas(empresa_id, periodos, lote_tamanho))
+
+    print(f"[BENCHMARK] SQL: {total} linhas em {tempo_sql:.2f}s")
+    print(f"[BENCHMARK] Python (LIMIT/OFFSET, só leitura): {sum(referencia.values())} linhas em {tempo_python:.2f}s")
+    if tempo_sql > 0:
+        print(f"[BENCHMARK] Razão Python/SQL: {tempo_python / tempo_sql:.1f}x")
+
+    so_python = referencia - materializadas
+    so_sql = materializadas - referencia
+    if not so_python and not so_sql:
+        print("[OK] Linhas idênticas nos dois caminhos.")
+        return True
+
+    print(f"[AVISO] Divergências: {sum(so_python.values())} linhas só no Python, {sum(so_sql.values())} só no SQL.")
+    for linha in _exemplos(linhasReferencia(empresa_id, periodos, lote_tamanho), so_python):
+        print("  Python:", dict(zip(COLUNAS_COMPARADAS, linha)))
+    for linha in _exemplos(linhasMaterializadas(empresa_id, periodos, lote_tamanho), so_sql):
+        print("  SQL:   ", dict(zip(COLUNAS_COMPARADAS, linha)))
+    return False
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara a materialização da c170_clone com o cálculo antigo em Python.")
+    parser.add_argument('empresa_id', type=int)
+    parser.add_argument('--periodo', action='append', help="MM/AAAA (pode repetir; padrão: empresa inteira)")
+    parser.add_argument('--lote', type=int, default=5000)
+    args = parser.parse_args()
+    raise SystemExit(0 if comparar(args.empresa_id, args.periodo, args.lote) else 1)
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,7 @@
 import asyncio
 import xlsxwriter
 from PySide6.QtCore import QThread, Signal
-from db.conexao import conectarBanco, fecharBanco
+from db.conexao import conectarBanco, fecharBanco, consultarEmLotes
 from services.spedService.pos_processamento import etapas_pos_processamento
 
 class ExportWorker(QThread):
@@ -33,13 +33,14 @@ class ExportWorker(QThread):
                 SELECT codigo, produto, ncm 
                 FROM cadastro_tributacao 
                 WHERE empresa_id = %s AND (aliquota IS NULL OR TRIM(aliquota) = '')
+                LIMIT 1
             """, (self.empresa_id,))
             if cursor.fetchall():
                 print("[EXPORT] Alíquotas nulas detectadas. Executando pós-processamento...")
                 cursor.close()
                 fecharBanco(conexao)
                 
-                asyncio.run(self.executarPosProcessamento())
+                asyncio.run(self.executarPosProcessamento(periodo))
                 
                 conexao = conectarBanco()
                 if not conexao:
@@ -47,21 +48,9 @@ class ExportWorker(QThread):
                     return
                 cursor = conexao.cursor()
 
-            cursor.execute("""
-                SELECT DISTINCT 
-                    c.id, c.empresa_id, c.id_c100, c.ind_oper, c.filial, c.periodo, c.reg, c.cod_part,
-                    IFNULL(f.nome, '') AS nome, IFNULL(f.cnpj, '') AS cnpj,
-                    c.num_doc, c.cod_item, c.chv_nfe, c.num_item, c.descr_compl, c.ncm, c.unid,
-                    c.qtd, c.vl_item, c.vl_desc, c.cfop, c.cst, c.aliquota, c.resultado
-                FROM c170_clone c
-                LEFT JOIN `0150` f 
-                ON f.cod_part = c.cod_part 
-                AND f.empresa_id = c.empresa_id 
-                AND f.periodo = c.periodo
-                WHERE c.periodo = %s AND c.empresa_id = %s
-            """, (periodo, self.empresa_id))
-            dados = cursor.fetchall()
-            if not dados:
+            cursor.execute("SELECT COUNT(*) FROM c170_clone WHERE periodo = %s AND empresa_id = %s", (periodo, self.empresa_id))
+            total_linhas = cursor.fetchone()[0]
+            if not total_linhas:
                 self.erro.emit("Não existem dados para o mês e ano selecionados.")
                 return
 
@@ -88,7 +77,8 @@ class ExportWorker(QThread):
             dt_fin_fmt = f"{dt_fin[:2]}/{dt_fin[2:4]}/{dt_fin[4:]}"
             periodo_legivel = f"Período: {dt_ini_fmt} a {dt_fin_fmt}"
 
-            workbook = xlsxwriter.Workbook(self.caminho_arquivo)
+            # constant_memory grava cada linha no disco assim que a próxima começa
+            workbook = xlsxwriter.Workbook(self.caminho_arquivo, {'constant_memory': True})
             worksheet = workbook.add_worksheet()
 
             worksheet.write('A1', nome_empresa)
@@ -100,21 +90,37 @@ class ExportWorker(QThread):
             for col_idx, col_name in enumerate(colunas_desejadas):
                 worksheet.write(2, col_idx, col_name)
 
-            for row_idx, row in enumerate(dados, start=3):
-                dados_dict = dict(zip(colunas, row))
-                for col_idx, nome_coluna in enumerate(colunas_desejadas):
-                    valor = dados_dict.get(nome_coluna, '')
-                    if nome_coluna in colunas_numericas:
-                        try:
-                            valor = float(valor)
-                            valor = f"{valor:,.2f}".replace(",", "v").replace(".", ",").replace("v", ".")
-                        except:
-                            pass
-                    worksheet.write_string(row_idx, col_idx, str(valor))
-
-                if row_idx % 10000 == 0:
-                    progresso = min(95, 60 + int(row_idx / len(dados) * 40))
-                    self.progress.emit(progresso)
+            lotes = consultarEmLotes(conexao, """
+                SELECT DISTINCT 
+                    c.id, c.empresa_id, c.id_c100, c.ind_oper, c.filial, c.periodo, c.reg, c.cod_part,
+                    IFNULL(f.nome, '') AS nome, IFNULL(f.cnpj, '') AS cnpj,
+                    c.num_doc, c.cod_item, c.chv_nfe, c.num_item, c.descr_compl, c.ncm, c.unid,
+                    c.qtd, c.vl_item, c.vl_desc, c.cfop, c.cst, c.aliquota, c.resultado
+                FROM c170_clone c
+                LEFT JOIN `0150` f 
+                ON f.cod_part = c.cod_part 
+                AND f.empresa_id = c.empresa_id 
+                AND f.periodo = c.periodo
+                WHERE c.periodo = %s AND c.empresa_id = %s
+            """, (periodo, self.empresa_id))
+
+            row_idx = 2
+            for lote in lotes:
+                for row in lote:
+                    row_idx += 1
+                    dados_dict = dict(zip(colunas, row))
+                    for col_idx, nome_coluna in enumerate(colunas_desejadas):
+                        valor = dados_dict.get(nome_coluna, '')
+                        if nome_coluna in colunas_numericas:
+                            try:
+                                valor = float(valor)
+                                valor = f"{valor:,.2f}".replace(",", "v").replace(".", ",").replace("v", ".")
+                            except:
+                                pass
+                        worksheet.write_string(row_idx, col_idx, str(valor))
+
+                progresso = min(95, 60 + int((row_idx - 2) / total_linhas * 35))
+                self.progress.emit(progresso)
 
             workbook.close()
             self.progress.emit(95)
@@ -129,14 +135,14 @@ class ExportWorker(QThread):
             except:
                 pass
 
-    async def executarPosProcessamento(self):
+    async def executarPosProcessamento(self, periodo):
         try:
             class MockProgressBar:
                 def setValue(self, value):
                     pass
             
             mock_progress = MockProgressBar()
-            await etapas_pos_processamento(self.empresa_id, mock_progress, self.janela_pai)
+            await etapas_pos_processamento(self.empresa_id, mock_progress, self.janela_pai, periodos=[periodo])
             print("[EXPORT] Pós-processamento concluído. Continuando exportação...")
             
         except Exception as e:
@@ -1,5 +1,10 @@
+import asyncio
+import threading
+import time
 from db.conexao import conectarBanco, fecharBanco
+from db.criarTabelas import criar_tabela_fornecedores_cnpj
 from utils.cnpj import processar_cnpjs
+from utils.configuracao import obterConfigInt
 from PySide6.QtCore import QObject, Signal
 
 class Mensageiro(QObject):
@@ -8,9 +13,23 @@ class Mensageiro(QObject):
 
 mensageiro = Mensageiro()
 
-BATCH_SIZE = 50
+# Linhas por INSERT na tabela temporária de resultados
+LOTE_STAGING = 5000
+
+# Validade dos dados do cadastro geral de CNPJs antes de nova consulta. CNPJs sem
+# dados (inválidos, não encontrados ou incompletos) também ficam no cadastro geral,
+# com o motivo, e voltam à consulta depois de FORNECEDORES_CNPJ_TTL_NEGATIVO_DIAS.
+FORNECEDORES_CNPJ_TTL_DIAS = obterConfigInt('FORNECEDORES_CNPJ_TTL_DIAS', 30)
+FORNECEDORES_CNPJ_TTL_NEGATIVO_DIAS = obterConfigInt('FORNECEDORES_CNPJ_TTL_NEGATIVO_DIAS', 7)
+
+# Registro do cadastro geral (apelido m) ainda dentro da validade; parâmetros: os dois TTLs
+SQL_CADASTRO_VALIDO = "m.atualizado_em >= NOW() - INTERVAL IF(m.motivo IS NULL, %s, %s) DAY"
+
+_tabela_verificada = False
 
 async def fornecedor(empresa_id):
+    """Cadastra os fornecedores do 0150 e completa os dados pelo cadastro geral de CNPJs
+    (consultando só os CNPJs que ele não tem). Devolve as linhas gravadas, ou None se algo ficou pendente."""
     conexao = conectarBanco()
     cursor = conexao.cursor()
 
@@ -23,60 +42,203 @@ async def fornecedor(empresa_id):
         columns = [row[0] for row in cursor.fetchall()]
         if not all(col in columns for col in ['cnae', 'decreto', 'uf', 'simples']):
             print("Colunas obrigatórias não encontradas.")
-            return
+            return None
 
-        print("Buscando fornecedores a adicionar")
+        # Um fornecedor por cod_part (o último 0150 lido), só os que ainda não existem
+        print("Adicionando fornecedores novos do 0150")
         cursor.execute("""
-            SELECT f.cod_part, f.nome, f.cnpj
+            INSERT INTO cadastro_fornecedores (empresa_id, cod_part, nome, cnpj, uf, cnae, decreto, simples)
+            SELECT f.empresa_id, f.cod_part, f.nome, f.cnpj, '', '', '', ''
             FROM `0150` f
+            JOIN (
+                SELECT MAX(id) AS id
+                FROM `0150`
+                WHERE empresa_id = %s AND cnpj IS NOT NULL AND cnpj != ''
+                GROUP BY TRIM(cod_part)
+            ) u ON u.id = f.id
             LEFT JOIN cadastro_fornecedores cf ON TRIM(f.cod_part) = TRIM(cf.cod_part) AND f.empresa_id = cf.empresa_id
-            WHERE cf.cod_part IS NULL AND f.cnpj IS NOT NULL AND f.cnpj != '' AND f.empresa_id = %s
+            WHERE cf.cod_part IS NULL
         """, (empresa_id,))
-        fornecedores = cursor.fetchall()
-
-        for cod_part, nome, cnpj in fornecedores:
-            cursor.execute("""
-                INSERT INTO cadastro_fornecedores (empresa_id, cod_part, nome, cnpj, uf, cnae, decreto, simples)
-                VALUES (%s, %s, %s, %s, '', '', '', '')
-            """, (empresa_id, cod_part, nome, cnpj))
+        adicionados = cursor.rowcount
         conexao.commit()
-        print(f"{len(fornecedores)} fornecedores adicionados.")
+        print(f"{adicionados} fornecedores adicionados.")
 
-        print("Buscando fornecedores com dados pendentes.")
-        cursor.execute("""
-            SELECT cnpj
-            FROM cadastro_fornecedores
-            WHERE empresa_id = %s AND cnpj IS NOT NULL AND cnpj != ''
-              AND (cnae IS NULL OR cnae = '' OR decreto IS NULL OR decreto = '' OR uf IS NULL OR uf = '')
-        """, (empresa_id,))
+        # Os dados de CNPJ ficam no cadastro geral (fornecedores_cnpj), compartilhado
+        # entre as empresas. Vão à consulta os CNPJs da empresa que ele ainda não tem
+        # ou cujo registro passou da validade, inclusive de fornecedores já completos:
+        # é assim que os dados antigos são renovados. Os negativos também são gravados,
+        # então um CNPJ não encontrado não volta à consulta a cada execução.
+        garantirTabelaCadastroGeral(cursor)
+        print("Buscando CNPJs sem dados atualizados no cadastro geral.")
+        cursor.execute(f"""
+            SELECT DISTINCT cf.cnpj
+            FROM cadastro_fornecedores cf
+            LEFT JOIN fornecedores_cnpj m
+                   ON m.cnpj = cf.cnpj AND {SQL_CADASTRO_VALIDO}
+            WHERE cf.empresa_id = %s AND cf.cnpj IS NOT NULL AND cf.cnpj != ''
+              AND m.cnpj IS NULL
+        """, (FORNECEDORES_CNPJ_TTL_DIAS, FORNECEDORES_CNPJ_TTL_NEGATIVO_DIAS, empresa_id))
         cnpjs = [row[0] for row in cursor.fetchall()]
 
-        if not cnpjs:
-            print("Nenhum CNPJ pendente de atualização.")
-            return
-
-        print(f"Consultando dados externos para {len(cnpjs)} CNPJs.")
-        resultados = await processar_cnpjs(cnpjs)
-
-        print("Atualizando cadastro_fornecedores em lotes.")
-        for i in range(0, len(cnpjs), BATCH_SIZE):
-            batch = cnpjs[i:i + BATCH_SIZE]
-            for cnpj in batch:
-                if cnpj in resultados:
-                    cnae, decreto, uf, simples = resultados[cnpj]
-                    cursor.execute("""
-                        UPDATE cadastro_fornecedores
-                        SET cnae = %s, decreto = %s, uf = %s, simples = %s
-                        WHERE cnpj = %s AND empresa_id = %s
-                    """, (cnae, decreto, uf, simples, cnpj, empresa_id))
+        falhas = set()
+        if cnpjs:
+            print(f"Consultando dados externos para {len(cnpjs)} CNPJs.")
+            negativos = {}
+            resultados = await processar_cnpjs(cnpjs, falhas, negativos=negativos)
+            gravados = gravarCadastroGeral(cursor, resultados, negativos)
             conexao.commit()
-            print(f"Lote de {len(batch)} CNPJs atualizado.")
+            print(f"{gravados} CNPJs gravados no cadastro geral ({len(negativos)} sem dados).")
+        else:
+            print("Nenhum CNPJ pendente de consulta.")
+
+        # Negativos não apagam os dados que o fornecedor já tinha
+        print("Atualizando cadastro_fornecedores a partir do cadastro geral.")
+        cursor.execute("""
+            UPDATE cadastro_fornecedores cf
+            JOIN fornecedores_cnpj m ON m.cnpj = cf.cnpj
+            SET cf.cnae = m.cnae, cf.decreto = m.decreto, cf.uf = m.uf, cf.simples = m.simples
+            WHERE cf.empresa_id = %s AND m.motivo IS NULL
+        """, (empresa_id,))
+        atualizados = cursor.rowcount
+        conexao.commit()
+        print(f"{atualizados} fornecedores atualizados.")
 
         print("Atualização concluída com sucesso.")
+        if falhas:
+            print(f"{len(falhas)} CNPJs sem resposta da API; serão consultados novamente.")
+            return None
+        return adicionados + atualizados
 
     except Exception as e:
         conexao.rollback()
         print(f"Erro durante atualização de fornecedores: {e}")
+        return None
     finally:
         cursor.close()
         fecharBanco(conexao)
+
+def garantirTabelaCadastroGeral(cursor):
+    global _tabela_verificada
+    if not _tabela_verificada:
+        criar_tabela_fornecedores_cnpj(cursor)
+        _tabela_verificada = True
+
+def gravarCadastroGeral(cursor, resultados, negativos=None):
+    """
+    Carrega {cnpj: (cnae, decreto, uf, simples)} e os `negativos` ({cnpj: motivo}, sem
+    dados) numa tabela temporária e grava tudo no cadastro geral num único upsert.
+    """
+    if not resultados and not negativos:
+        return 0
+    cursor.execute("DROP TEMPORARY TABLE IF EXISTS tmp_fornecedores_cnpj")
+    cursor.execute("""
+        CREATE TEMPORARY TABLE tmp_fornecedores_cnpj (
+            cnpj VARCHAR(20) PRIMARY KEY,
+            cnae VARCHAR(20),
+            decreto VARCHAR(10),
+            uf VARCHAR(5),
+            simples VARCHAR(10),
+            motivo VARCHAR(20)
+        )
+    """)
+    try:
+        linhas = [(cnpj, *dados, None) for cnpj, dados in resultados.items()]
+        linhas += [(cnpj, None, None, None, None, motivo) for cnpj, motivo in (negativos or {}).items()]
+        for i in range(0, len(linhas), LOTE_STAGING):
+            cursor.executemany("""
+                INSERT INTO tmp_fornecedores_cnpj (cnpj, cnae, decreto, uf, simples, motivo)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """, linhas[i:i + LOTE_STAGING])
+
+        cursor.execute("""
+            INSERT INTO fornecedores_cnpj (cnpj, cnae, uf, simples, decreto, motivo)
+            SELECT cnpj, cnae, uf, simples, decreto, motivo FROM tmp_fornecedores_cnpj
+            ON DUPLICATE KEY UPDATE cnae = VALUES(cnae), uf = VALUES(uf), simples = VALUES(simples),
+                decreto = VALUES(decreto), motivo = VALUES(motivo), atualizado_em = CURRENT_TIMESTAMP
+        """)
+        return len(linhas)
+    finally:
+        cursor.execute("DROP TEMPORARY TABLE IF EXISTS tmp_fornecedores_cnpj")
+
+def cnpjsAtualizados(cursor, cnpjs):
+    """CNPJs de `cnpjs` que já estão no cadastro geral dentro da validade (com dados ou negativos)."""
+    cnpjs = list(cnpjs)
+    encontrados = set()
+    for i in range(0, len(cnpjs), LOTE_STAGING):
+        lote = cnpjs[i:i + LOTE_STAGING]
+        marcadores = ', '.join(['%s'] * len(lote))
+        cursor.execute(f"""
+            SELECT m.cnpj FROM fornecedores_cnpj m
+            WHERE m.cnpj IN ({marcadores}) AND {SQL_CADASTRO_VALIDO}
+        """, (*lote, FORNECEDORES_CNPJ_TTL_DIAS, FORNECEDORES_CNPJ_TTL_NEGATIVO_DIAS))
+        encontrados.update(row[0] for row in cursor.fetchall())
+    return encontrados
+
+async def preencherCadastroGeral(cnpjs):
+    """Consulta e grava no cadastro geral os `cnpjs` que ele ainda não tem. Devolve quantos foram gravados."""
+    conexao = conectarBanco()
+    cursor = conexao.cursor()
+    try:
+        garantirTabelaCadastroGeral(cursor)
+        consultar = set(cnpjs) - cnpjsAtualizados(cursor, cnpjs)
+        if not consultar:
+            return 0
+        negativos = {}
+        resultados = await processar_cnpjs(sorted(consultar), negativos=negativos)
+        gravados = gravarCadastroGeral(cursor, resultados, negativos)
+        conexao.commit()
+        return gravados
+    finally:
+        cursor.close()
+        fecharBanco(conexao)
+
+class PrefetchFornecedores:
+    """
+    Consulta os CNPJs dos participantes (0150) em segundo plano enquanto o resto do
+    SPED é gravado, deixando o cadastro geral pronto para o fornecedor() do
+    pós-processamento. `iniciar` é chamado pelo salvamento ao fim do bloco 0 de cada
+    arquivo; `aguardar` espera as consultas em andamento.
+    Uma única thread atende todos os arquivos: os CNPJs que chegam enquanto uma
+    rodada está em curso são juntados na próxima, então só há um limitador e uma
+    sessão HTTP por vez e os limites CNPJ_TAXA_MAXIMA/CNPJ_CONCORRENCIA valem para
+    o total.
+    """
+    def __init__(self):
+        self._vistos = set()
+        self._pendentes = set()
+        self._thread = None
+        self._condicao = threading.Condition()
+
+    def iniciar(self, cnpjs):
+        with self._condicao:
+            novos = {c for c in cnpjs if c} - self._vistos
+            if not novos:
+                return
+            self._vistos |= novos
+            self._pendentes |= novos
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._executar, daemon=True)
+                self._thread.start()
+            self._condicao.notify_all()
+
+    def _executar(self):
+        while True:
+            with self._condicao:
+                if not self._pendentes:
+                    self._thread = None
+                    self._condicao.notify_all()
+                    return
+                cnpjs, self._pendentes = self._pendentes, set()
+
+            inicio = time.perf_counter()
+            try:
+                gravados = asyncio.run(preencherCadastroGeral(cnpjs))
+                print(f"[PREFETCH] {len(cnpjs)} CNPJs de participantes verificados, {gravados} gravados no cadastro geral "
+                      f"em {time.perf_counter() - inicio:.2f}s.")
+            except Exception as e:
+                # O fornecedor() do pós-processamento consulta o que faltar
+                print(f"[AVISO] Falha na consulta antecipada de CNPJs: {e}")
+
+    def aguardar(self):
+        with self._condicao:
+            self._condicao.wait_for(lambda: self._thread is None)
@@ -1,8 +1,7 @@
 from .carregamento import processarSped
 from .salvamento import salvarDados
 from .pos_processamento import etapas_pos_processamento
-from .tributacao import criarC170nova
-from .atualizacoes import atualizarAliquota, aliquotaSimples, atualizarResultado
+from .materializacao import materializarC170Clone
 from .verificacoes import verificaoPopupAliquota, preencherTributacao, sinal_popup
 
 
@@ -0,0 +1,192 @@
+import asyncio
+import hashlib
+import time
+from collections import namedtuple
+from db.conexao import obterConexao
+from db.criarTabelas import criar_tabela_pos_processamento_etapas
+from services.spedService.periodos import filtroPeriodos, descreverPeriodos
+
+# Agendador das etapas do pós-processamento.
+# Cada etapa declara os recursos (tabelas) que lê e grava; a ordem entre etapas
+# sai dessas declarações (a ordem da lista só desempata leitura/escrita do mesmo
+# recurso) e etapas sem dependência entre si rodam ao mesmo tempo, cada uma numa
+# thread com seu próprio event loop. Etapas `isoladas` (as que abrem janela) rodam
+# sozinhas na thread de quem chamou.
+# Ao terminar, a etapa grava em pos_processamento_etapas a assinatura dos seus
+# recursos, a duração e as linhas; se na próxima execução a assinatura for a
+# mesma, ela é pulada. A função da etapa devolve o número de linhas gravadas;
+# None significa que não concluiu (erro tratado ou pendências) e ela roda de novo.
+
+Etapa = namedtuple('Etapa', 'nome funcao entradas saidas isolada sempre')
+Contexto = namedtuple('Contexto', 'empresa_id periodos janela_pai')
+
+def etapa(nome, funcao, entradas=(), saidas=(), isolada=False, sempre=False):
+    return Etapa(nome, funcao, tuple(entradas), tuple(saidas), isolada, sempre)
+
+# Recurso -> (tabela, filtra por período, colunas do checksum, filtra por empresa).
+# Tabelas só de inserção usam COUNT + MAX(id); cadastros, que o usuário edita,
+# usam um checksum das colunas relevantes. fornecedores_cnpj é compartilhado entre
+# as empresas (prefetch e outras empresas também o atualizam), então entra inteiro.
+RECURSOS = {
+    '0150': ('0150', False, None, True),
+    '0200': ('0200', False, None, True),
+    'c100': ('c100', True, None, True),
+    'c170': ('c170', True, None, True),
+    'c170_clone': ('c170_clone', True, None, True),
+    'cadastro_fornecedores': ('cadastro_fornecedores', False, ('cod_part', 'cnpj', 'uf', 'cnae', 'decreto', 'simples'), True),
+    'cadastro_tributacao': ('cadastro_tributacao', False, ('codigo', 'produto', 'ncm', 'aliquota'), True),
+    'fornecedores_cnpj': ('fornecedores_cnpj', False, ('cnpj', 'cnae', 'uf', 'simples', 'decreto'), False),
+}
+
+_tabela_verificada = False
+
+def _garantirTabela(cursor):
+    global _tabela_verificada
+    if not _tabela_verificada:
+        criar_tabela_pos_processamento_etapas(cursor)
+        _tabela_verificada = True
+
+def _escopo(periodos):
+    texto = '*' if periodos is None else ','.join(periodos)
+    return hashlib.sha1(texto.encode()).hexdigest()
+
+def assinarRecursos(recursos, empresa_id, periodos):
+    """Assinatura (sha1) do estado atual dos recursos, no escopo da empresa/períodos."""
+    partes = []
+    with obterConexao() as conexao:
+        cursor = conexao.cursor()
+        try:
+            for recurso in sorted(set(recursos)):
+                tabela, por_periodo, colunas, por_empresa = RECURSOS[recurso]
+                filtro, parametros = filtroPeriodos(periodos) if por_periodo else ("", ())
+                if por_empresa:
+                    filtro, parametros = f" AND empresa_id = %s{filtro}", (empresa_id, *parametros)
+                if colunas:
+                    valores = ', '.join(f"IFNULL({c}, '<nulo>')" for c in colunas)
+                    agregado = f"IFNULL(SUM(CRC32(CONCAT_WS('|', {valores}))), 0)"
+                else:
+                    agregado = "IFNULL(MAX(id), 0)"
+                cursor.execute(f"SELECT COUNT(*), {agregado} FROM `{tabela}` WHERE 1 = 1{filtro}", parametros)
+                partes.append(f"{recurso}:{cursor.fetchone()}")
+        finally:
+            cursor.close()
+    return hashlib.sha1('|'.join(partes).encode()).hexdigest()
+
+def _ultimaAssinatura(empresa_id, nome, periodos):
+    with obterConexao() as conexao:
+        cursor = conexao.cursor()
+        try:
+            _garantirTabela(cursor)
+            cursor.execute("""
+                SELECT assinatura FROM pos_processamento_etapas
+                WHERE empresa_id = %s AND etapa = %s AND escopo = %s
+            """, (empresa_id, nome, _escopo(periodos)))
+            linha = cursor.fetchone()
+            return linha[0] if linha else None
+        finally:
+            cursor.close()
+
+def _registrar(empresa_id, nome, periodos, assinatura, duracao, linhas):
+    with obterConexao() as conexao:
+        cursor = conexao.cursor()
+        try:
+            _garantirTabela(cursor)
+            cursor.execute("""
+                INSERT INTO pos_processamento_etapas (empresa_id, etapa, escopo, periodos, assinatura, duracao, linhas)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE periodos = VALUES(periodos), assinatura = VALUES(assinatura),
+                    duracao = VALUES(duracao), linhas = VALUES(linhas)
+            """, (empresa_id, nome, _escopo(periodos), descreverPeriodos(periodos), assinatura, round(duracao, 3), linhas))
+            conexao.commit()
+        finally:
+            cursor.close()
+
+def dependencias(etapas):
+    """{nome: nomes das etapas anteriores que gravam o que ela usa ou usam o que ela grava}."""
+    deps = {}
+    for i, atual in enumerate(etapas):
+        usa = set(atual.entradas) | set(atual.saidas)
+        deps[atual.nome] = {
+            anterior.nome for anterior in etapas[:i]
+            if set(anterior.saidas) & usa or set(anterior.entradas) & set(atual.saidas)
+        }
+    return deps
+
+async def _rodarEtapa(e, contexto):
+    recursos = e.entradas + e.saidas
+    inicio = time.perf_counter()
+
+    if not e.sempre:
+        antes, ultima = await asyncio.gather(
+            asyncio.to_thread(assinarRecursos, recursos, contexto.empresa_id, contexto.periodos),
+            asyncio.to_thread(_ultimaAssinatura, contexto.empresa_id, e.nome, contexto.periodos),
+        )
+        if antes == ultima:
+            print(f"[AGENDA] {e.nome}: recursos sem alteração desde a última execução. Etapa pulada.")
+            return {"etapa": e.nome, "situacao": "pulada", "duracao": time.perf_counter() - inicio, "linhas": None}
+
+    print(f"[AGENDA] {e.nome}: iniciando.")
+    if e.isolada:
+        linhas = await e.funcao(contexto)
+    else:
+        linhas = await asyncio.to_thread(asyncio.run, e.funcao(contexto))
+    duracao = time.perf_counter() - inicio
+
+    concluida = isinstance(linhas, int) and not isinstance(linhas, bool)
+    assinatura = None
+    if concluida and not e.sempre:
+        assinatura = await asyncio.to_thread(assinarRecursos, recursos, contexto.empresa_id, contexto.periodos)
+    await asyncio.to_thread(
+        _registrar, contexto.empresa_id, e.nome, contexto.periodos, assinatura, duracao, linhas if concluida else None
+    )
+
+    situacao = "executada" if concluida or e.sempre else "incompleta"
+    print(f"[AGENDA] {e.nome}: {situacao} em {duracao:.2f}s" + (f", {linhas} linhas." if concluida else "."))
+    return {"etapa": e.nome, "situacao": situacao, "duracao": duracao, "linhas": linhas if concluida else None}
+
+async def executarEtapas(etapas, contexto, progress_bar=None, inicio=40, fim=100):
+    """Executa as etapas respeitando as dependências; devolve o resumo de cada uma."""
+    deps = dependencias(etapas)
+    pendentes = list(etapas)
+    ativas = {}
+    concluidas = set()
+    resumo = []
+    erro = None
+
+    while pendentes or ativas:
+        if erro is None and not any(e.isolada for e in ativas.values()):
+            for e in list(pendentes):
+                if not deps[e.nome] <= concluidas:
+                    continue
+                if e.isolada and ativas:
+                    break
+                pendentes.remove(e)
+                ativas[asyncio.ensure_future(_rodarEtapa(e, contexto))] = e
+                if e.isolada:
+                    break
+        elif erro is not None:
+            pendentes.clear()
+
+        if not ativas:
+            if pendentes:
+                raise RuntimeError(f"Dependências sem solução: {[e.nome for e in pendentes]}")
+            break
+
+        prontas, _ = await asyncio.wait(ativas, return_when=asyncio.FIRST_COMPLETED)
+        for tarefa in prontas:
+            e = ativas.pop(tarefa)
+            concluidas.add(e.nome)
+            try:
+                resumo.append(tarefa.result())
+            except Exception as ex:
+                print(f"[AGENDA] {e.nome}: falhou ({ex}). Nenhuma nova etapa será iniciada.")
+                erro = erro or ex
+            if progress_bar is not None:
+                progress_bar.setValue(inicio + (fim - inicio) * len(concluidas) // len(etapas))
+
+    total = sum(r["duracao"] for r in resumo)
+    print(f"[AGENDA] {len(resumo)} etapas em {total:.2f}s de trabalho: " +
+          ", ".join(f"{r['etapa']}={r['situacao']}" for r in resumo))
+    if erro is not None:
+        raise erro
+    return resumo
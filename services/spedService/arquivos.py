@@ -0,0 +1,62 @@
+from db.criarTabelas import criar_tabela_sped_arquivos
+
+# Registro de ingestão: um SPED é identificado pelo SHA-256 do conteúdo, por empresa.
+# status: processando -> concluido | erro | periodo_carregado. registros_confirmados é
+# o número de registros já confirmados no banco, gravado na mesma transação da carga,
+# e é o ponto de retomada quando a carga do arquivo foi interrompida.
+# periodo_carregado: o 0000 do arquivo é de um período/filial que outra carga já
+# gravou; o arquivo é ignorado enquanto esse período continuar no banco.
+STATUS_PROCESSANDO = 'processando'
+STATUS_CONCLUIDO = 'concluido'
+STATUS_ERRO = 'erro'
+STATUS_PERIODO_CARREGADO = 'periodo_carregado'
+
+_tabela_verificada = False
+
+def garantirTabelaArquivos(cursor):
+    global _tabela_verificada
+    if not _tabela_verificada:
+        criar_tabela_sped_arquivos(cursor)
+        _tabela_verificada = True
+
+def consultarArquivos(cursor, empresa_id, hashes):
+    """Devolve {hash: dict} com os arquivos da empresa já presentes no registro."""
+    if not hashes:
+        return {}
+    garantirTabelaArquivos(cursor)
+    marcadores = ', '.join(['%s'] * len(hashes))
+    cursor.execute(f"""
+        SELECT id, hash_sha256, nome, periodo, filial, status, registros_confirmados
+        FROM sped_arquivos
+        WHERE empresa_id = %s AND hash_sha256 IN ({marcadores})
+    """, (empresa_id, *hashes))
+    colunas = ('id', 'hash', 'nome', 'periodo', 'filial', 'status', 'registros_confirmados')
+    return {linha[1]: dict(zip(colunas, linha)) for linha in cursor.fetchall()}
+
+def registrarArquivo(cursor, empresa_id, hash_arquivo, nome):
+    """Cria (ou reabre) a entrada do arquivo como 'processando' e devolve seu id."""
+    garantirTabelaArquivos(cursor)
+    cursor.execute("""
+        INSERT INTO sped_arquivos (empresa_id, hash_sha256, nome, status)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id), nome = VALUES(nome), status = VALUES(status)
+    """, (empresa_id, hash_arquivo, nome, STATUS_PROCESSANDO))
+    return cursor.lastrowid
+
+def confirmarArquivo(cursor, id_arquivo, registros, periodo, filial, status=STATUS_PROCESSANDO):
+    """Atualiza o ponto de retomada; deve ser chamada antes do commit do lote."""
+    cursor.execute("""
+        UPDATE sped_arquivos
+        SET registros_confirmados = %s, periodo = %s, filial = %s, status = %s
+        WHERE id = %s
+    """, (registros, periodo, filial, status, id_arquivo))
+
+def marcarArquivo(cursor, id_arquivo, status):
+    cursor.execute("UPDATE sped_arquivos SET status = %s WHERE id = %s", (status, id_arquivo))
+
+def periodoCarregado(cursor, empresa_id, periodo, filial):
+    cursor.execute(
+        "SELECT COUNT(*) FROM `0000` WHERE periodo = %s AND empresa_id = %s AND filial = %s",
+        (periodo, empresa_id, filial)
+    )
+    return cursor.fetchone()[0] > 0
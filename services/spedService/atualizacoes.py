@@ -1,156 +1,42 @@
-from db.conexao import conectarBanco, fecharBanco
-from utils.conversao import Conversor
-
-async def atualizarAliquota(empresa_id, lote_tamanho=5000):
-    print("[INÍCIO] Atualizando alíquotas em c170_clone por lotes...")
-
-    conexao = conectarBanco(dict_cursor=True)
-    cursor = conexao.cursor(dictionary=True) 
-
-    try:
-        print("[DEBUG] Buscando dt_ini na tabela 0000...")
-        cursor.execute("SELECT dt_ini FROM `0000` WHERE empresa_id = %s ORDER BY id DESC LIMIT 1", (empresa_id,))
-        row = cursor.fetchone()
-        print(f"[DEBUG] Resultado dt_ini: {row}")
-        if not row or not row['dt_ini']:
-            print("[AVISO] Nenhum dt_ini encontrado. Cancelando.")
-            return
-
-        coluna = "aliquota"
-        print(f"[DEBUG] Usando coluna: {coluna}")
-
-        print("[DEBUG] Buscando registros para atualização...")
-        cursor.execute(f"""
-            SELECT n.id AS id_c170, c.{coluna} AS nova_aliquota, n.descr_compl, n.ncm
-            FROM c170_clone n
-            JOIN cadastro_tributacao c
-              ON c.empresa_id = n.empresa_id
-             AND c.produto = n.descr_compl
-             AND c.ncm = n.ncm
-            WHERE n.empresa_id = %s
-              AND (n.aliquota IS NULL OR n.aliquota = '')
-              AND c.{coluna} IS NOT NULL AND c.{coluna} != ''
-        """, (empresa_id,))
-        registros = cursor.fetchall()
-        total = len(registros)
-        print(f"[INFO] {total} registros a atualizar...")
-
-        if total == 0:
-            print("[DEBUG] Nenhum registro encontrado para atualização.")
-        else:
-            print(f"[DEBUG] Exemplo de registro para atualizar: {registros[0] if registros else 'Nenhum'}")
-
-        for i in range(0, total, lote_tamanho):
-            lote = registros[i:i + lote_tamanho]
-            dados = [(r['nova_aliquota'][:10], r['id_c170']) for r in lote]
-
-            print(f"[DEBUG] Atualizando lote {i//lote_tamanho + 1} com {len(lote)} itens.")
-            if len(lote) > 0:
-                print(f"[DEBUG] Primeiro item do lote: {lote[0]}")
-            cursor.executemany("""
-                UPDATE c170_clone
-                SET aliquota = %s
-                WHERE id = %s
-            """, dados)
-            conexao.commit()
-            print(f"[OK] Lote {i//lote_tamanho + 1} atualizado com {len(lote)} itens.")
-
-        print(f"[FINALIZADO] Alíquotas atualizadas em {total} registros para empresa {empresa_id}.")
-
-    except Exception as err:
-        print(f"[ERRO] ao atualizar alíquotas: {err}")
-        conexao.rollback()
-
-    finally:
-        cursor.close()
-        fecharBanco(conexao)
-
-async def aliquotaSimples(empresa_id, periodo):
-    print("[INÍCIO] Atualizando alíquotas Simples Nacional")
-    conexao = conectarBanco(dict_cursor=True)
-    cursor = conexao.cursor(dictionary=True)
-
-    try:
-        cursor.execute("""
-            SELECT c.id, c.aliquota, c.descr_compl, c.cod_part
-            FROM c170_clone c
-            JOIN cadastro_fornecedores f 
-                ON f.cod_part = c.cod_part AND f.empresa_id = %s
-            WHERE c.periodo = %s AND c.empresa_id = %s
-              AND f.simples = 'Sim'
-        """, (empresa_id, periodo, empresa_id))
-
-        registros = cursor.fetchall()
-        atualizacoes = []
-
-        for row in registros:
-            aliquota_str = str(row.get('aliquota') or '').strip().upper()
-            if aliquota_str in ['ST', 'ISENTO', 'PAUTA', '']:
-                continue
-
-            try:
-                aliquota = Conversor(row['aliquota'])
-                nova_aliquota = round(aliquota + 3, 2)
-                aliquota_str = f"{nova_aliquota:.2f}".replace('.', ',') + '%'
-                atualizacoes.append((aliquota_str, row['id']))
-            except Exception as e:
-                print(f"[AVISO] Erro ao processar registro {row['id']}: {e}")
-
-        if atualizacoes:
-            cursor.executemany("""
-                UPDATE c170_clone
-                SET aliquota = %s
-                WHERE id = %s
-            """, atualizacoes)
-            conexao.commit()
-
-    except Exception as e:
-        print(f"[ERRO] ao atualizar alíquota Simples: {e}")
-        conexao.rollback()
-
-    finally:
-        cursor.close()
-        fecharBanco(conexao)
-        print("[FIM] Finalização da atualização de alíquota Simples.")
-
-async def atualizarResultado(empresa_id):
-    print("[INÍCIO] Atualizando resultado")
-    conexao = conectarBanco(dict_cursor=True)
-    cursor = conexao.cursor(dictionary=True)
-
-    try:
-        cursor.execute("""
-            SELECT id, vl_item, vl_desc, aliquota 
-            FROM c170_clone
-            WHERE empresa_id = %s
-        """, (empresa_id,))
-
-        registros = cursor.fetchall()
-        total = len(registros)
-
-        atualizacoes = []
-
-        for row in registros:
-            vl_item = Conversor(row['vl_item'])
-            vl_desc = Conversor(row['vl_desc'])
-            aliquota = Conversor(row['aliquota'])
-            resultado = round((vl_item - vl_desc) * (aliquota / 100), 2)
-            atualizacoes.append((resultado, row['id']))
-
-        if atualizacoes:
-            cursor.executemany("""
-                UPDATE c170_clone
-                SET resultado = %s
-                WHERE id = %s
-            """, atualizacoes)
-            conexao.commit()
-            print(f"[OK] Resultado atualizado para {total} registros.")
-
-    except Exception as err:
-        print(f"[ERRO] ao atualizar resultado: {err}")
-        conexao.rollback()
-
-    finally:
-        cursor.close()
-        fecharBanco(conexao)
-        print("[FIM] Finalização da atualização de resultado.")
+from utils.conversao import Conversor, sqlConversor, sqlMaisDe4Decimais
+
+# Expressões e cálculos de alíquota e resultado usados pela materialização da
+# c170_clone (materializacao.py), em SQL e no Python.
+
+# Valores em DECIMAL exato. As linhas em que o float do Python poderia arredondar
+# diferente vão para o Python (coluna `python`): entrada com mais de 4 decimais,
+# magnitude em que o erro do float alcança a 10ª casa, empate exato na 3ª casa
+# e negativos que arredondam para zero (-0.0).
+def sqlCamposValores(l_item, l_desc, l_aliq):
+    """Colunas a, b, cc e longo a partir dos valores já limpos (sqlLimpo)."""
+    return f"""
+           {sqlConversor(l_item)} AS a,
+           {sqlConversor(l_desc)} AS b,
+           {sqlConversor(l_aliq)} AS cc,
+           ({sqlMaisDe4Decimais(l_item)} OR {sqlMaisDe4Decimais(l_desc)} OR {sqlMaisDe4Decimais(l_aliq)}) AS longo"""
+
+def sqlCamposResultado(v):
+    """(texto, python) sobre as colunas a, b, cc e longo do apelido `v`."""
+    p = f"({v}.a - {v}.b) * {v}.cc / 100"
+    texto = f"CAST(ROUND({p}, 2) AS CHAR)"
+    python = f"""({v}.longo
+            OR ({v}.a + {v}.b) * {v}.cc / 100 >= 100000
+            OR ({p} * 1000 = FLOOR({p} * 1000) AND MOD(FLOOR(ABS({p}) * 1000), 10) = 5)
+            OR ({v}.a < {v}.b AND ROUND({p}, 2) = 0))"""
+    return texto, python
+
+# repr() do float do Python: '12.50' -> '12.5', '3.00' -> '3.0'
+def sqlTextoFloat(texto):
+    return f"IF(RIGHT({texto}, 1) = '0', LEFT({texto}, CHAR_LENGTH({texto}) - 1), {texto})"
+
+def calcularResultado(vl_item, vl_desc, aliquota):
+    return round((Conversor(vl_item) - Conversor(vl_desc)) * (Conversor(aliquota) / 100), 2)
+
+ALIQUOTAS_SEM_AJUSTE_SIMPLES = ('ST', 'ISENTO', 'PAUTA', '')
+
+def ajustarAliquotaSimples(aliquota):
+    """Fornecedor do Simples: alíquota + 3 no formato '15,00%'. ST, ISENTO, PAUTA e vazio não mudam."""
+    if str(aliquota or '').strip().upper() in ALIQUOTAS_SEM_AJUSTE_SIMPLES:
+        return aliquota
+    nova_aliquota = round(Conversor(aliquota) + 3, 2)
+    return f"{nova_aliquota:.2f}".replace('.', ',') + '%'
@@ -0,0 +1,65 @@
+import os
+import tempfile
+import time
+from utils.configuracao import obterConfig
+from .registros import sqlInsercao
+
+# CARREGADOR_C170=executemany (padrão) ou load_data.
+# O load_data exige local_infile=ON no servidor MySQL.
+CARREGADORES_VALIDOS = ('executemany', 'load_data')
+CARREGADOR_C170 = obterConfig('CARREGADOR_C170', 'executemany').lower()
+
+if CARREGADOR_C170 not in CARREGADORES_VALIDOS:
+    print(f"[AVISO] CARREGADOR_C170 '{CARREGADOR_C170}' desconhecido. Usando executemany.")
+    CARREGADOR_C170 = 'executemany'
+
+def valorTsv(valor):
+    if valor is None:
+        return '\\N'
+    return (
+        str(valor)
+        .replace('\\', '\\\\')
+        .replace('\t', '\\t')
+        .replace('\n', '\\n')
+        .replace('\r', '\\r')
+    )
+
+def carregarExecutemany(cursor, tabela, colunas, lote):
+    cursor.executemany(sqlInsercao(tabela, colunas), lote)
+
+def carregarLoadData(cursor, tabela, colunas, lote):
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', newline='', suffix='.tsv', delete=False) as arquivo:
+        for linha in lote:
+            arquivo.write('\t'.join(map(valorTsv, linha)))
+            arquivo.write('\n')
+        caminho = arquivo.name
+
+    try:
+        cursor.execute(f"""
+            LOAD DATA LOCAL INFILE %s
+            INTO TABLE `{tabela}`
+            CHARACTER SET utf8mb4
+            FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\'
+            LINES TERMINATED BY '\\n'
+            ({', '.join(colunas)})
+        """, (caminho,))
+    finally:
+        os.remove(caminho)
+
+def carregarLote(cursor, tabela, colunas, lote, carregador=None):
+    """
+    Grava `lote` em `tabela` pelo carregador configurado e devolve o tempo gasto,
+    registrando linhas/s para comparar executemany com LOAD DATA.
+    """
+    carregador = carregador or CARREGADOR_C170
+    inicio = time.perf_counter()
+
+    if carregador == 'load_data':
+        carregarLoadData(cursor, tabela, colunas, lote)
+    else:
+        carregarExecutemany(cursor, tabela, colunas, lote)
+
+    decorrido = time.perf_counter() - inicio
+    taxa = len(lote) / decorrido if decorrido > 0 else 0
+    print(f"[CARGA] {tabela} via {carregador}: {len(lote)} linhas em {decorrido:.2f}s ({taxa:,.0f} linhas/s)")
+    return decorrido
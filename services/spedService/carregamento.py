@@ -2,19 +2,32 @@ import asyncio
 import threading
 import os
 import math
+import queue
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from PySide6.QtWidgets import QFileDialog
 from PySide6.QtCore import QObject, Signal
 
 from db.conexao import conectarBanco, fecharBanco
-from utils.processData import process_data
+from utils.processData import iniciarLeitor, produzirLotesNaFila, calcularHash
+from utils.configuracao import obterConfigInt, obterConfigBool
 from utils.mensagem import mensagem_sucesso, mensagem_error, mensagem_aviso
-from .salvamento import salvarDados
+from .salvamento import salvarDados, PeriodoJaCarregado
+from .arquivos import (
+    consultarArquivos, registrarArquivo, marcarArquivo, confirmarArquivo, periodoCarregado,
+    STATUS_CONCLUIDO, STATUS_ERRO, STATUS_PERIODO_CARREGADO,
+)
 from .pos_processamento import etapas_pos_processamento
-from services.fornecedorService import mensageiro as mensageiro_fornecedor
+from services.fornecedorService import mensageiro as mensageiro_fornecedor, PrefetchFornecedores
 from services.spedService.limpeza import limpar_tabelas_temporarias
 
 sem_limite = asyncio.Semaphore(3)
 
+SPED_ESCRITORES = obterConfigInt('SPED_ESCRITORES', 2)
+SPED_FILA_LOTES = obterConfigInt('SPED_FILA_LOTES', 4)
+# Consulta os CNPJs dos participantes (0150) em paralelo com a gravação do C100/C170
+PREFETCH_CNPJ = obterConfigBool('PREFETCH_CNPJ', True)
+
 class Mensageiro(QObject):
     sinal_sucesso = Signal(str)
     sinal_erro = Signal(str)
@@ -65,6 +78,197 @@ def iniciarProcessamentoSped(empresa_id, progress_bar, label_arquivo, janela=Non
     thread.start()
     print(f"[DEBUG] Thread de processamento SPED iniciada")
 
+def registrosDaFila(fila, estado):
+    while True:
+        lote = fila.get()
+        if lote is None:
+            estado["fim"] = True
+            return
+        if isinstance(lote, Exception):
+            raise lote
+        yield from lote
+
+def esvaziarFila(fila, estado):
+    while not estado["fim"]:
+        if fila.get() is None:
+            estado["fim"] = True
+
+def planejarArquivos(empresa_id, caminhos, hashes):
+    """
+    Consulta o registro de ingestão (sped_arquivos) e devolve o plano de cada arquivo:
+    None para os já concluídos, os repetidos na seleção e os de período já carregado
+    por outro arquivo e, para os demais, o id no registro e o ponto de retomada.
+    """
+    conexao = conectarBanco()
+    if not conexao:
+        raise ConnectionError("Erro ao conectar ao banco")
+    cursor = conexao.cursor()
+    try:
+        existentes = consultarArquivos(cursor, empresa_id, sorted(set(hashes) - {None}))
+        planos = []
+        vistos = set()
+        for caminho, hash_arquivo in zip(caminhos, hashes):
+            if hash_arquivo is None:
+                planos.append(None)
+                continue
+            nome = os.path.basename(caminho)
+            info = existentes.get(hash_arquivo)
+            if hash_arquivo in vistos or (info and info["status"] == STATUS_CONCLUIDO):
+                print(f"[INFO] {nome} já foi carregado anteriormente. Ignorando.")
+                planos.append(None)
+                continue
+            if (info and info["status"] == STATUS_PERIODO_CARREGADO
+                    and periodoCarregado(cursor, empresa_id, info["periodo"], info["filial"])):
+                print(f"[INFO] {nome}: período {info['periodo']} (filial {info['filial']}) já carregado por outro arquivo. Ignorando.")
+                planos.append(None)
+                continue
+            vistos.add(hash_arquivo)
+
+            retomar_de = info["registros_confirmados"] if info else 0
+            if retomar_de:
+                print(f"[INFO] Retomando {nome} a partir do registro {retomar_de}.")
+            planos.append({
+                "id_arquivo": registrarArquivo(cursor, empresa_id, hash_arquivo, nome),
+                "retomar_de": retomar_de,
+            })
+        conexao.commit()
+        return planos
+    finally:
+        cursor.close()
+        fecharBanco(conexao)
+
+def executarPipelineSped(empresa_id, caminhos, aoGravarArquivo=None, aoLerParticipantes=None, aoLerArquivo=None):
+    """
+    Leitura e gravação sobrepostas: os processos do pool calculam o SHA-256 dos arquivos,
+    os já carregados são ignorados e os demais são lidos e publicados em lotes em filas
+    limitadas (multiprocessing.Queue, uma por arquivo, entregues aos processos pelo
+    initializer do pool; cada lote é serializado uma única vez, do leitor direto para a
+    escritora), enquanto threads escritoras, cada uma com sua conexão, gravam os
+    arquivos na ordem em que foram selecionados.
+    Nenhum arquivo volta inteiro ao processo principal: cada leitor fica bloqueado com
+    no máximo SPED_FILA_LOTES + 1 lotes em trânsito.
+    A falha de um arquivo não interrompe os demais.
+    Devolve (situacao, mensagem, periodos) de cada arquivo, com situacao 'gravado', 'ignorado'
+    ou 'erro' e os períodos lidos do arquivo.
+    `aoLerParticipantes` é repassado ao salvarDados de cada arquivo.
+    `aoLerArquivo(i, lidos)` é chamado quando a leitura de cada arquivo termina e
+    `aoGravarArquivo(i, gravados)` quando a gravação termina.
+    """
+    total = len(caminhos)
+    processos = min(total, os.cpu_count() or 1)
+    escritores = max(1, min(SPED_ESCRITORES, total))
+    print(f"[DEBUG] Pipeline SPED: {processos} leitor(es), {escritores} escritor(es), fila de {SPED_FILA_LOTES} lote(s) por arquivo")
+
+    pendentes = queue.Queue()
+    resultados = [None] * total
+    gravados = []
+    lidos = []
+    trava = threading.Lock()
+    filas = [multiprocessing.Queue(maxsize=SPED_FILA_LOTES) for _ in caminhos]
+
+    def arquivoLido(i):
+        with trava:
+            lidos.append(i)
+            concluidos = len(lidos)
+        if aoLerArquivo:
+            aoLerArquivo(i, concluidos)
+
+    with ProcessPoolExecutor(max_workers=processos, initializer=iniciarLeitor, initargs=(filas,)) as executor:
+        hashes = []
+        for i, futuro in enumerate([executor.submit(calcularHash, caminho) for caminho in caminhos]):
+            try:
+                hashes.append(futuro.result())
+            except OSError as e:
+                print(f"[ERRO] Falha ao ler {caminhos[i]}: {e}")
+                resultados[i] = ("erro", f"{os.path.basename(caminhos[i])}: {e}", set())
+                hashes.append(None)
+        planos = planejarArquivos(empresa_id, caminhos, hashes)
+
+        for i, plano in enumerate(planos):
+            if plano is None:
+                if resultados[i] is None:
+                    resultados[i] = ("ignorado", f"{os.path.basename(caminhos[i])} já havia sido carregado.", set())
+                lidos.append(i)
+                gravados.append(i)
+                continue
+            leitura = executor.submit(produzirLotesNaFila, caminhos[i], i)
+            leitura.add_done_callback(lambda _, i=i: arquivoLido(i))
+            pendentes.put(i)
+
+        def escritor():
+            conexao = conectarBanco()
+            cursor = conexao.cursor() if conexao else None
+            try:
+                while True:
+                    try:
+                        i = pendentes.get_nowait()
+                    except queue.Empty:
+                        return
+
+                    nome = os.path.basename(caminhos[i])
+                    plano = planos[i]
+                    estado = {"fim": False}
+                    periodos = set()
+                    registros = registrosDaFila(filas[i], estado)
+                    try:
+                        if not conexao:
+                            raise ConnectionError("Erro ao conectar ao banco")
+                        mensagem = asyncio.run(salvarDados(
+                            registros, cursor, conexao, empresa_id,
+                            verificar_periodo=(plano["retomar_de"] == 0),
+                            id_arquivo=plano["id_arquivo"],
+                            retomar_de=plano["retomar_de"],
+                            periodos=periodos,
+                            aoLerParticipantes=aoLerParticipantes,
+                        ))
+                        if mensagem.lower().startswith(("falha", "erro")):
+                            raise RuntimeError(mensagem)
+                        resultados[i] = ("gravado", mensagem, periodos)
+                    except PeriodoJaCarregado as e:
+                        # Não é falha do arquivo: fica registrado para não ser relido enquanto
+                        # o período continuar no banco
+                        print(f"[AVISO] {nome}: {e}")
+                        resultados[i] = ("ignorado", f"{nome}: {e}", set())
+                        try:
+                            conexao.rollback()
+                            confirmarArquivo(cursor, plano["id_arquivo"], 0, e.periodo, e.filial, STATUS_PERIODO_CARREGADO)
+                            conexao.commit()
+                        except Exception as e_registro:
+                            print(f"[ERRO] Não foi possível registrar {nome}: {e_registro}")
+                    except Exception as e:
+                        print(f"[ERRO] Falha ao gravar {nome}: {e}")
+                        resultados[i] = ("erro", f"{nome}: {e}", set())
+                        if conexao:
+                            try:
+                                conexao.rollback()
+                                marcarArquivo(cursor, plano["id_arquivo"], STATUS_ERRO)
+                                conexao.commit()
+                            except Exception as e_registro:
+                                print(f"[ERRO] Não foi possível marcar {nome} com erro: {e_registro}")
+                    finally:
+                        # Esvazia o restante da fila para não travar o leitor do arquivo
+                        esvaziarFila(filas[i], estado)
+
+                    with trava:
+                        gravados.append(i)
+                        concluidos = len(gravados)
+                    if aoGravarArquivo:
+                        aoGravarArquivo(i, concluidos)
+            finally:
+                if conexao:
+                    cursor.close()
+                    fecharBanco(conexao)
+
+        threads = [threading.Thread(target=escritor) for _ in range(escritores)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    for fila in filas:
+        fila.close()
+    return resultados
+
 async def processarSped(empresa_id, progress_bar, label_arquivo, caminhos, janela=None):
     print(f"[DEBUG] Iniciando processamento de {len(caminhos)} arquivo(s) SPED...")
 
@@ -83,81 +287,55 @@ async def processarSped(empresa_id, progress_bar, label_arquivo, caminhos, janel
 
     total = len(caminhos)
     progresso_por_arquivo = math.ceil(100 / total) if total > 0 else 100
-    dados_gerais = []
 
-    try:
-        for i, caminho in enumerate(caminhos):
-            nome_arquivo = os.path.basename(caminho)
-            label_arquivo.setText(f"Processando arquivo {i+1}/{total}: {nome_arquivo}")
+    def arquivoLido(i, lidos):
+        label_arquivo.setText(f"Arquivo {lidos}/{total} lido: {os.path.basename(caminhos[i])}")
+        progress_bar.setValue(min(lidos * progresso_por_arquivo, 100))
 
-            with open(caminho, 'r', encoding='utf-8', errors='ignore') as arquivo:
-                conteudo = arquivo.read().strip()
+    def arquivoGravado(i, gravados):
+        label_arquivo.setText(f"Arquivo {gravados}/{total} gravado: {os.path.basename(caminhos[i])}")
 
-            print(f"[DEBUG] Lendo: {nome_arquivo}")
-            print(f"[DEBUG] Tamanho conteúdo bruto: {len(conteudo)}")
-
-            conteudo_processado = process_data(conteudo)
-            print(f"[DEBUG] Resultado process_data: Tipo={type(conteudo_processado)}, Tamanho={len(conteudo_processado) if isinstance(conteudo_processado, list) else 'N/A'}")
-
-            if isinstance(conteudo_processado, str):
-                linhas = conteudo_processado.strip().splitlines()
-            elif isinstance(conteudo_processado, list):
-                linhas = conteudo_processado
-            else:
-                linhas = []
-
-            print(f"[DEBUG] Adicionando {len(linhas)} linhas do arquivo {nome_arquivo}")
-            dados_gerais.extend(linhas)
+    try:
+        label_arquivo.setText(f"Lendo e gravando {total} arquivo(s)...")
 
-            progresso_atual = min((i + 1) * progresso_por_arquivo, 100)
-            progress_bar.setValue(progresso_atual)
-            await asyncio.sleep(0.1)
+        #limpar_tabelas_temporarias(empresa_id)
 
-        conexao = conectarBanco()
-        cursor = conexao.cursor()
+        prefetch = PrefetchFornecedores() if PREFETCH_CNPJ else None
+        resultados = executarPipelineSped(empresa_id, caminhos, arquivoGravado,
+                                          prefetch.iniciar if prefetch else None, arquivoLido)
+        if prefetch:
+            await asyncio.to_thread(prefetch.aguardar)
+        gravados = [mensagem for situacao, mensagem, _ in resultados if situacao == "gravado"]
+        ignorados = [mensagem for situacao, mensagem, _ in resultados if situacao == "ignorado"]
+        falhas = [mensagem for situacao, mensagem, _ in resultados if situacao == "erro"]
+        periodos = sorted(set().union(*(p for situacao, _, p in resultados if situacao == "gravado")))
 
-        #limpar_tabelas_temporarias(empresa_id)
+        if not gravados:
+            if falhas:
+                return False, "\n".join(falhas)
+            return False, "Todos os arquivos selecionados já haviam sido carregados."
 
-        mensagem = await salvarDados(dados_gerais, cursor, conexao, empresa_id)
-        conexao.commit()
-        cursor.close()
-        fecharBanco(conexao)
+        await etapas_pos_processamento(empresa_id, progress_bar, janela_pai=janela, periodos=periodos)
 
-        if isinstance(mensagem, str) and not mensagem.lower().startswith(("falha", "erro")):
-            await etapas_pos_processamento(empresa_id, progress_bar, janela_pai=janela)
-            return True, mensagem
-        else:
-            return False, mensagem or "Erro durante salvamento em lote."
+        mensagem = gravados[-1]
+        if ignorados:
+            mensagem += f"\n{len(ignorados)} arquivo(s) já carregado(s) anteriormente foram ignorados."
+        if falhas:
+            mensagem += "\nArquivos com falha:\n" + "\n".join(falhas)
+        return True, mensagem
 
     except ValueError as ve:
         print(f"[AVISO] Processamento interrompido: {ve}")
-        if conexao:
-            try:
-                cursor.close()
-                fecharBanco(conexao)
-            except:
-                pass
         progress_bar.setValue(0)
         label_arquivo.setText("Processamento interrompido.")
         return False, str(ve)
     except Exception as e:
         import traceback
         print("[ERRO] Falha no processar_sped:", traceback.format_exc())
-        if conexao:
-            try:
-                cursor.close()
-                fecharBanco(conexao)
-            except:
-                pass
         progress_bar.setValue(0)
         label_arquivo.setText("Erro no processamento.")
         return False, f"Erro inesperado durante o processamento: {e}"
 
     finally:
-        if conexao:
-            try:
-                fecharBanco(conexao)
-            except:
-                pass
         await asyncio.sleep(0.5)
         label_arquivo.setText("Processamento finalizado.")
\ No newline at end of file
@@ -2,7 +2,7 @@ from db.conexao import conectarBanco, fecharBanco
 
 def limpar_tabelas_temporarias(empresa_id):
     print("iniciando limpeza condicional")
-    tabelas = ['`0000`', '`0150`', '`0200`', '`c100`', '`c170`', '`c170nova`']
+    tabelas = ['`0000`', '`0150`', '`0200`', '`c100`', '`c170`', '`c190`']
 
     conexao = conectarBanco()
     cursor = conexao.cursor()
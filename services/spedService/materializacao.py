@@ -0,0 +1,244 @@
+import time
+from db.conexao import conectarBanco, fecharBanco, consultarEmLotes
+from utils.configuracao import obterConfigBool, obterConfigInt
+from utils.conversao import sqlLimpo, sqlConversor, sqlNormalizado
+from services.spedService.periodos import filtroPeriodos, descreverPeriodos
+from services.spedService.atualizacoes import (
+    ALIQUOTAS_SEM_AJUSTE_SIMPLES, calcularResultado, ajustarAliquotaSimples,
+    sqlCamposValores, sqlCamposResultado, sqlTextoFloat,
+)
+
+# Gera a c170_clone direto da c170, numa única gravação por linha: filtro de
+# fornecedor e enriquecimento pelo 0200 (o que era a c170nova), alíquota do
+# cadastro_tributacao, ajuste do Simples e resultado. Cada INSERT cobre uma
+# faixa de MATERIALIZACAO_FAIXA_IDS ids da c170.
+MATERIALIZACAO_FAIXA_IDS = obterConfigInt('MATERIALIZACAO_FAIXA_IDS', 50000)
+
+# O padrão calcula alíquota e resultado no banco e exige MySQL 8 (REGEXP_REPLACE e
+# dicas NO_MERGE). RESULTADO_PYTHON=1 volta ao cálculo linha a linha em Python: o banco
+# só seleciona os itens com a alíquota do cadastro (SQL comum, vale para MySQL 5.7), e o
+# ajuste do Simples e o resultado são feitos com calcularAliquotaResultado antes do INSERT.
+RESULTADO_PYTHON = obterConfigBool('RESULTADO_PYTHON', False)
+
+CFOPS_MATERIALIZACAO = ('1101', '1401', '1102', '1403', '1910', '1116')
+
+COLUNAS_CLONE = (
+    'empresa_id', 'cod_item', 'periodo', 'reg', 'num_item', 'descr_compl', 'ncm', 'qtd', 'unid',
+    'vl_item', 'vl_desc', 'cst', 'cfop', 'id_c100', 'filial',
+    'ind_oper', 'cod_part', 'num_doc', 'chv_nfe',
+)
+
+# Itens de entrada de fornecedor do CE sem decreto. Descrição e NCM vêm do último
+# 0200 do item (descrição vazia cai na do próprio C170).
+def sqlItens(filtro):
+    cfops = ', '.join(['%s'] * len(CFOPS_MATERIALIZACAO))
+    return f"""
+        SELECT
+            c.id, c.empresa_id, c.cod_item, c.periodo, c.reg, c.num_item,
+            COALESCE(NULLIF(p.descr_item, ''), c.descr_compl) AS descr_compl, p.cod_ncm AS ncm,
+            c.qtd, c.unid, c.vl_item, c.vl_desc, c.cst_icms AS cst, c.cfop, c.id_c100, c.filial,
+            c.ind_oper, cc.cod_part, cc.num_doc, cc.chv_nfe
+        FROM c170 c
+        JOIN c100 cc ON cc.id = c.id_c100
+        LEFT JOIN (
+            SELECT cod_item, MAX(id) AS id
+            FROM `0200`
+            WHERE empresa_id = %s
+            GROUP BY cod_item
+        ) u ON u.cod_item = c.cod_item
+        LEFT JOIN `0200` p ON p.id = u.id
+        WHERE c.empresa_id = %s
+          AND c.id BETWEEN %s AND %s
+          AND c.cfop IN ({cfops}){filtro}
+          AND EXISTS (
+              SELECT 1 FROM cadastro_fornecedores f
+              WHERE f.cod_part = cc.cod_part AND f.empresa_id = c.empresa_id
+                AND f.uf = 'CE' AND f.decreto = 'Não'
+          )
+    """
+
+def _sqlSimples(coluna):
+    return f"""EXISTS (
+                SELECT 1 FROM cadastro_fornecedores s
+                WHERE s.cod_part = {coluna} AND s.empresa_id = %s AND s.simples = 'Sim'
+            )"""
+
+# Itens com a alíquota do último cadastro_tributacao do produto/NCM ('' se não houver)
+# e a marca de fornecedor do Simples. Parâmetros: (empresa_id, *parâmetros de sqlItens).
+def sqlItensAliquota(filtro, dica=""):
+    return f"""
+        SELECT {dica}i.*,
+               IFNULL((
+                   SELECT LEFT(t.aliquota, 10)
+                   FROM cadastro_tributacao t
+                   WHERE t.empresa_id = i.empresa_id
+                     AND t.produto = i.descr_compl
+                     AND t.ncm = i.ncm
+                     AND t.aliquota IS NOT NULL AND t.aliquota <> ''
+                   ORDER BY t.id DESC
+                   LIMIT 1
+               ), '') AS aliquota_base,
+               {_sqlSimples('i.cod_part')} AS simples
+        FROM ({sqlItens(filtro)}) i
+    """
+
+# Camadas: i (itens) -> b (alíquota do cadastro e Simples) -> q (alíquota final)
+# -> v (valores limpos) -> w (valores numéricos) -> INSERT. NO_MERGE em cada nível
+# evita que o MySQL funda as camadas e repita as expressões pesadas.
+# Linhas em que o SQL poderia divergir do Python (alíquota do Simples com mais de
+# 2 decimais ou com espaços estranhos, e as bordas do resultado) são gravadas com
+# a alíquota do cadastro e resultado NULL, e completadas em Python depois.
+def sqlMaterializacao(filtro):
+    sem_ajuste = ', '.join(f"'{a}'" for a in ALIQUOTAS_SEM_AJUSTE_SIMPLES)
+    base_normalizada = sqlNormalizado('b.l_base')
+    texto, python = sqlCamposResultado('w')
+    colunas = ', '.join(COLUNAS_CLONE)
+    colunas_w = ', '.join(f"w.{c}" for c in COLUNAS_CLONE)
+    return f"""
+    INSERT IGNORE INTO c170_clone ({colunas}, aliquota, resultado)
+    SELECT /*+ NO_MERGE(w) */
+        {colunas_w},
+        IF(w.python_aliquota OR {python}, w.aliquota_base, w.aliquota),
+        IF(w.python_aliquota OR {python}, NULL, {sqlTextoFloat(texto)})
+    FROM (
+        SELECT /*+ NO_MERGE(v) */ v.*,{sqlCamposValores('v.l_item', 'v.l_desc', 'v.l_aliq')}
+        FROM (
+            SELECT /*+ NO_MERGE(q) */ q.*, {sqlLimpo('q.vl_item')} AS l_item, {sqlLimpo('q.vl_desc')} AS l_desc,
+                   {sqlLimpo('q.aliquota')} AS l_aliq
+            FROM (
+                SELECT /*+ NO_MERGE(b) */ b.*,
+                       IF(b.simples AND CAST(UPPER(TRIM(b.aliquota_base)) AS BINARY) NOT IN ({sem_ajuste}),
+                          LEFT(CONCAT(REPLACE(CAST(ROUND({sqlConversor('b.l_base')} + 3, 2) AS CHAR), '.', ','), '%'), 10),
+                          b.aliquota_base) AS aliquota,
+                       (b.simples AND (b.aliquota_base REGEXP '[[:space:]]'
+                            OR (CAST(UPPER(b.aliquota_base) AS BINARY) NOT IN ({sem_ajuste})
+                                AND {base_normalizada} REGEXP '[.][0-9]{{3,}}'))) AS python_aliquota
+                FROM (
+                    SELECT /*+ NO_MERGE(i) */ i.*, {sqlLimpo('i.aliquota_base')} AS l_base
+                    FROM ({sqlItensAliquota(filtro, '/*+ NO_MERGE(i) */ ')}) i
+                ) b
+            ) q
+        ) v
+    ) w
+    ORDER BY w.id
+    """
+
+async def materializarC170Clone(empresa_id, periodos=None, lote_tamanho=5000):
+    """
+    Regrava a c170_clone dos `periodos` (None = empresa inteira) a partir da c170,
+    já com alíquota (cadastro_tributacao + Simples) e resultado.
+    Devolve o número de linhas gravadas (None em caso de falha).
+    """
+    print(f"[INÍCIO] Materializando c170_clone para empresa_id={empresa_id} ({descreverPeriodos(periodos)})")
+    filtro_clone, parametros_periodo = filtroPeriodos(periodos)
+    filtro_c170, _ = filtroPeriodos(periodos, 'c.periodo')
+    if RESULTADO_PYTHON:
+        sql = sqlItensAliquota(filtro_c170) + " ORDER BY i.id"
+    else:
+        sql = sqlMaterializacao(filtro_c170)
+
+    conexao = conectarBanco()
+    leitura = conectarBanco()
+    cursor = conexao.cursor()
+
+    try:
+        inicio = time.perf_counter()
+        cursor.execute(f"DELETE FROM c170_clone WHERE empresa_id = %s{filtro_clone}", (empresa_id, *parametros_periodo))
+        removidos = cursor.rowcount
+        conexao.commit()
+        print(f"[DEBUG] {removidos} registros antigos removidos de c170_clone.")
+
+        cursor.execute(f"SELECT MIN(id), MAX(id) FROM c170 WHERE empresa_id = %s{filtro_clone}",
+                       (empresa_id, *parametros_periodo))
+        menor, maior = cursor.fetchone()
+        if menor is None:
+            print("[DEBUG] Nenhum item encontrado para materializar.")
+            return 0
+
+        total = 0
+        for primeiro in range(menor, maior + 1, MATERIALIZACAO_FAIXA_IDS):
+            ultimo = primeiro + MATERIALIZACAO_FAIXA_IDS - 1
+            parametros = (
+                empresa_id, empresa_id, empresa_id, primeiro, ultimo,
+                *CFOPS_MATERIALIZACAO, *parametros_periodo
+            )
+            if RESULTADO_PYTHON:
+                total += _gravarFaixaPython(cursor, sql, parametros)
+            else:
+                cursor.execute(sql, parametros)
+                total += cursor.rowcount
+            conexao.commit()
+
+        if RESULTADO_PYTHON:
+            bordas = total
+        else:
+            bordas = _completarBordas(conexao, cursor, leitura, empresa_id, filtro_c170, parametros_periodo, lote_tamanho)
+
+        print(f"[OK] c170_clone materializada em {time.perf_counter() - inicio:.2f}s: "
+              f"{total} registros, {bordas} completados em Python.")
+        return total
+
+    except Exception as e:
+        conexao.rollback()
+        print(f"[ERRO] Falha ao materializar c170_clone: {e}")
+        return None
+
+    finally:
+        cursor.close()
+        fecharBanco(leitura)
+        fecharBanco(conexao)
+        print("[FIM] Materialização finalizada.")
+
+def calcularAliquotaResultado(vl_item, vl_desc, aliquota, simples):
+    """(alíquota, resultado) como no cálculo antigo: ajuste do Simples e calcularResultado."""
+    if simples:
+        aliquota = ajustarAliquotaSimples(aliquota)
+        aliquota = aliquota[:10] if aliquota else aliquota
+    return aliquota, calcularResultado(vl_item, vl_desc, aliquota)
+
+_POS_VL_ITEM = COLUNAS_CLONE.index('vl_item')
+_POS_VL_DESC = COLUNAS_CLONE.index('vl_desc')
+
+SQL_INSERIR_CLONE = f"""
+    INSERT IGNORE INTO c170_clone ({', '.join(COLUNAS_CLONE)}, aliquota, resultado)
+    VALUES ({', '.join(['%s'] * (len(COLUNAS_CLONE) + 2))})
+"""
+
+def _gravarFaixaPython(cursor, sql, parametros):
+    """RESULTADO_PYTHON: lê a faixa com sqlItensAliquota e grava já com alíquota e resultado."""
+    cursor.execute(sql, parametros)
+    linhas = []
+    for _, *valores, aliquota, simples in cursor.fetchall():
+        aliquota, resultado = calcularAliquotaResultado(valores[_POS_VL_ITEM], valores[_POS_VL_DESC], aliquota, simples)
+        linhas.append((*valores, aliquota, resultado))
+    if not linhas:
+        return 0
+    cursor.executemany(SQL_INSERIR_CLONE, linhas)
+    return cursor.rowcount
+
+def _completarBordas(conexao, cursor, leitura, empresa_id, filtro, parametros_periodo, lote_tamanho):
+    """
+    Linhas com resultado NULL: ajuste do Simples e resultado calculados como antes, em Python.
+    `filtro` usa o apelido c (filtroPeriodos(periodos, 'c.periodo')).
+    """
+    registros = consultarEmLotes(leitura, f"""
+        SELECT c.id, c.vl_item, c.vl_desc, c.aliquota, {_sqlSimples('c.cod_part')} AS simples
+        FROM c170_clone c
+        WHERE c.empresa_id = %s{filtro}
+          AND c.resultado IS NULL
+    """, (empresa_id, empresa_id, *parametros_periodo), lote_tamanho)
+
+    total = 0
+    for lote in registros:
+        atualizacoes = []
+        for id_clone, vl_item, vl_desc, aliquota, simples in lote:
+            atualizacoes.append((*calcularAliquotaResultado(vl_item, vl_desc, aliquota, simples), id_clone))
+
+        cursor.executemany("""
+            UPDATE c170_clone
+            SET aliquota = %s, resultado = %s
+            WHERE id = %s
+        """, atualizacoes)
+        conexao.commit()
+        total += len(atualizacoes)
+    return total
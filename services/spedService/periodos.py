@@ -0,0 +1,16 @@
+# O pós-processamento recebe os períodos (MM/AAAA) tocados pela carga atual e
+# só relê/regrava esses períodos. periodos=None mantém o comportamento antigo
+# (empresa inteira), usado por quem não sabe o que mudou.
+
+def filtroPeriodos(periodos, coluna='periodo'):
+    """Devolve (trecho SQL ' AND coluna IN (...)', parâmetros) para somar ao WHERE."""
+    if periodos is None:
+        return "", ()
+    periodos = tuple(sorted(set(periodos)))
+    if not periodos:
+        return " AND 1 = 0", ()
+    marcadores = ', '.join(['%s'] * len(periodos))
+    return f" AND {coluna} IN ({marcadores})", periodos
+
+def descreverPeriodos(periodos):
+    return "todos os períodos" if periodos is None else ', '.join(sorted(set(periodos))) or "nenhum período"
@@ -1,55 +1,32 @@
-from PySide6.QtCore import QTimer
-from db.conexao import conectarBanco, fecharBanco
 from services.fornecedorService import fornecedor
-from services.spedService.tributacao import criarC170nova
-from services.spedService.atualizacoes import atualizarAliquota, aliquotaSimples, atualizarResultado
-from services.spedService.clonagem import clonar_tabela_c170nova
+from services.spedService.materializacao import materializarC170Clone
 from services.spedService.verificacoes import verificaoPopupAliquota, preencherTributacao
-
-async def etapas_pos_processamento(empresa_id, progress_bar, janela_pai=None):
-    print(f"[POS] Iniciando etapas de pós-processamento para empresa_id={empresa_id}...")
+from services.spedService.periodos import descreverPeriodos
+from services.spedService.agendador import etapa, executarEtapas, Contexto
+
+ETAPAS_POS_PROCESSAMENTO = [
+    etapa('fornecedores', lambda c: fornecedor(c.empresa_id),
+          entradas=('0150', 'fornecedores_cnpj'), saidas=('cadastro_fornecedores', 'fornecedores_cnpj')),
+    etapa('tributacao', lambda c: preencherTributacao(c.empresa_id, c.janela_pai, periodos=c.periodos),
+          entradas=('c170', 'c100', '0200', 'cadastro_fornecedores'), saidas=('cadastro_tributacao',)),
+    etapa('popup_aliquota', lambda c: verificaoPopupAliquota(c.empresa_id, c.janela_pai),
+          entradas=('cadastro_tributacao',), saidas=('cadastro_tributacao',), isolada=True, sempre=True),
+    etapa('c170_clone', lambda c: materializarC170Clone(c.empresa_id, periodos=c.periodos),
+          entradas=('c170', 'c100', '0200', 'cadastro_fornecedores', 'cadastro_tributacao'), saidas=('c170_clone',)),
+]
+
+async def etapas_pos_processamento(empresa_id, progress_bar, janela_pai=None, periodos=None):
+    """
+    `periodos`: períodos (MM/AAAA) tocados pela carga; cada etapa só relê e regrava
+    esses períodos. None processa a empresa inteira.
+    """
+    if periodos is not None:
+        periodos = sorted(set(periodos))
+    print(f"[POS] Iniciando etapas de pós-processamento para empresa_id={empresa_id} ({descreverPeriodos(periodos)})...")
 
     progress_bar.setValue(40)
-    await fornecedor(empresa_id)
-    print("[POS] Fornecedores atualizados.")
-
-    progress_bar.setValue(50)
-    criarC170nova(empresa_id)
-    print("[POS] Tabela c170nova criada e preenchida.")
-
-    progress_bar.setValue(52)
-    await preencherTributacao(empresa_id, janela_pai)
-    print("[POS] Cadastro de tributação preenchido com base na tabela 0200.")
-
-    progress_bar.setValue(54)
-    await verificaoPopupAliquota(empresa_id, janela_pai)
-    print("[POS] Popup de alíquotas exibido, se necessário.")
-
-    progress_bar.setValue(60)
-    await clonar_tabela_c170nova(empresa_id)
-    print("[POS] Tabela c170_clone criada com sucesso.")
-
-    await atualizarAliquota(empresa_id)
-    print("[POS] Alíquotas atualizadas na tabela c170_clone.")
-
-    conexao = conectarBanco()
-    cursor = conexao.cursor()
-    cursor.execute("SELECT dt_ini FROM `0000` WHERE empresa_id = %s ORDER BY id DESC LIMIT 1", (empresa_id,))
-    row = cursor.fetchone()
-    cursor.close()
-    fecharBanco(conexao)
-
-    periodo = f"{row[0][2:4]}/{row[0][4:]}" if row and len(row[0]) >= 6 else "00/0000"
-    print(f"[POS] Período detectado no pós-processamento: {periodo}")
-
-    progress_bar.setValue(85)
-    await aliquotaSimples(empresa_id, periodo)
-    print("[POS] Alíquotas do Simples Nacional ajustadas.")
-
-    progress_bar.setValue(90)
-    await atualizarResultado(empresa_id)
-    print("[POS] Campo resultado calculado com base em vl_item e aliquota.")
+    resumo = await executarEtapas(ETAPAS_POS_PROCESSAMENTO, Contexto(empresa_id, periodos, janela_pai), progress_bar)
 
     progress_bar.setValue(100)
     print("[POS] Pós-processamento concluído.")
-
+    return resumo
@@ -0,0 +1,121 @@
+from collections import namedtuple
+from operator import itemgetter
+from utils.siglas import obterUF
+from utils.sanitizacao import truncar, corrigirUnidade, corrigir_ind_mov, corrigir_cst_icms, TAMANHOS_MAXIMOS
+
+# Especificação declarativa dos registros SPED gravados no banco.
+# Cada Campo segue a ordem do leiaute do Guia Prático da EFD ICMS/IPI; coluna=None
+# descarta o campo. `derivados` são colunas calculadas por `derivar` a partir dos
+# valores extraídos e `contexto` são colunas preenchidas pelo salvamento
+# (período, filial, nota em aberto...), sempre nessa ordem após os campos.
+
+Campo = namedtuple('Campo', 'nome coluna tamanho sanitizar')
+Registro = namedtuple('Registro', 'tabela campos derivados contexto chave derivar')
+RegistroCompilado = namedtuple('RegistroCompilado', 'reg tabela colunas posicoes extrair derivar contexto chave sql')
+
+def campo(nome, tamanho=None, sanitizar=None, coluna=None):
+    return Campo(nome, coluna or nome, tamanho, sanitizar)
+
+def ignorar(nome):
+    return Campo(nome, None, None, None)
+
+def registro(tabela, campos, derivados=(), contexto=(), chave=None, derivar=None):
+    return Registro(tabela, campos, derivados, contexto, chave, derivar)
+
+def derivar0150(valores):
+    cnpj, municipio = valores[4], valores[7]
+    cod_uf = municipio[:2] if municipio else None
+    return [cod_uf, obterUF(cod_uf), "PF" if cnpj is None else "PJ"]
+
+REGISTROS_SPED = {
+    '0000': registro('0000', [
+        campo('reg'), campo('cod_ver'), campo('cod_fin'), campo('dt_ini'), campo('dt_fin'),
+        campo('nome'), campo('cnpj'), campo('cpf'), campo('uf'), campo('ie'),
+        campo('cod_mun', coluna='cod_num'), campo('im'), campo('suframa'), campo('ind_perfil'), campo('ind_ativ'),
+    ], contexto=('filial', 'periodo', 'empresa_id')),
+
+    '0150': registro('0150', [
+        campo('reg'), campo('cod_part', TAMANHOS_MAXIMOS['cod_part']), campo('nome', TAMANHOS_MAXIMOS['nome']),
+        campo('cod_pais'), campo('cnpj'), campo('cpf'), campo('ie'), campo('cod_mun'), campo('suframa'),
+        campo('end', coluna='ende'), campo('num'), campo('compl'), campo('bairro'),
+    ], derivados=('cod_uf', 'uf', 'pj_pf'), contexto=('periodo', 'empresa_id'), chave='cod_part', derivar=derivar0150),
+
+    '0200': registro('0200', [
+        campo('reg'), campo('cod_item', TAMANHOS_MAXIMOS['cod_item']), campo('descr_item', TAMANHOS_MAXIMOS['descr_item']),
+        campo('cod_barra'), campo('cod_ant_item'), campo('unid_inv', TAMANHOS_MAXIMOS['unid']), campo('tipo_item'),
+        campo('cod_ncm'), campo('ex_ipi'), campo('cod_gen'), campo('cod_lst', coluna='cod_list'), campo('aliq_icms'),
+        campo('cest'),
+    ], contexto=('periodo', 'empresa_id'), chave='cod_item'),
+
+    'C100': registro('c100', [
+        campo('reg'), campo('ind_oper'), campo('ind_emit'), campo('cod_part'), campo('cod_mod'), campo('cod_sit'),
+        campo('ser'), campo('num_doc'), campo('chv_nfe'), campo('dt_doc'), campo('dt_e_s'), campo('vl_doc'),
+        campo('ind_pgto'), campo('vl_desc'), campo('vl_abat_nt'), campo('vl_merc'), campo('ind_frt'), campo('vl_frt'),
+        campo('vl_seg'), campo('vl_out_da'), campo('vl_bc_icms'), campo('vl_icms'), campo('vl_bc_icms_st'),
+        campo('vl_icms_st'), campo('vl_ipi'), campo('vl_pis'), campo('vl_cofins'), campo('vl_pis_st'),
+        campo('vl_cofins_st'),
+    ], contexto=('periodo', 'filial', 'empresa_id')),
+
+    'C170': registro('c170', [
+        campo('reg'), campo('num_item'), campo('cod_item', TAMANHOS_MAXIMOS['cod_item']),
+        campo('descr_compl', TAMANHOS_MAXIMOS['descr_compl']), campo('qtd'),
+        campo('unid', TAMANHOS_MAXIMOS['unid'], corrigirUnidade), campo('vl_item'), campo('vl_desc'),
+        campo('ind_mov', sanitizar=corrigir_ind_mov), campo('cst_icms', sanitizar=corrigir_cst_icms), campo('cfop'),
+        campo('cod_nat', TAMANHOS_MAXIMOS['cod_nat']), campo('vl_bc_icms'), campo('aliq_icms'), campo('vl_icms'),
+        campo('vl_bc_icms_st'), campo('aliq_st'), campo('vl_icms_st'), campo('ind_apur'), campo('cst_ipi'),
+        campo('cod_enq'), campo('vl_bc_ipi'), campo('aliq_ipi'), campo('vl_ipi'), campo('cst_pis'), campo('vl_bc_pis'),
+        campo('aliq_pis'), campo('quant_bc_pis'), campo('aliq_pis_reais'), campo('vl_pis'), campo('cst_cofins'),
+        campo('vl_bc_cofins'), campo('aliq_cofins'), campo('quant_bc_cofins'), campo('aliq_cofins_reais'),
+        campo('vl_cofins'), campo('cod_cta', TAMANHOS_MAXIMOS['cod_cta']), campo('vl_abat_nt'),
+    ], contexto=('id_c100', 'filial', 'ind_oper', 'cod_part', 'num_doc', 'chv_nfe', 'periodo', 'empresa_id')),
+
+    'C190': registro('c190', [
+        campo('reg'), campo('cst_icms'), campo('cfop'), campo('aliq_icms'), campo('vl_opr'), campo('vl_bc_icms'),
+        campo('vl_icms'), campo('vl_bc_icms_st'), campo('vl_icms_st'), campo('vl_red_bc'), ignorar('vl_ipi'),
+        campo('cod_obs'),
+    ], contexto=('id_c100', 'periodo', 'empresa_id')),
+}
+
+def sqlInsercao(tabela, colunas):
+    marcadores = ', '.join(['%s'] * len(colunas))
+    return f"INSERT INTO `{tabela}` ({', '.join(colunas)}) VALUES ({marcadores})"
+
+def _ajuste(campo):
+    if campo.sanitizar and campo.tamanho:
+        return lambda v: truncar(campo.sanitizar(v), campo.tamanho)
+    if campo.sanitizar:
+        return campo.sanitizar
+    return lambda v: truncar(v, campo.tamanho)
+
+def compilarRegistro(reg, especificacao):
+    """Gera o extrator do registro: completa os campos ausentes, seleciona e sanitiza."""
+    campos = especificacao.campos
+    total = len(campos)
+    selecionados = [i for i, c in enumerate(campos) if c.coluna]
+    colunas_campos = tuple(campos[i].coluna for i in selecionados)
+    colunas = colunas_campos + tuple(especificacao.derivados) + tuple(especificacao.contexto)
+    pegar = itemgetter(*selecionados)
+    ajustes = [
+        (saida, _ajuste(campos[i]))
+        for saida, i in enumerate(selecionados)
+        if campos[i].tamanho or campos[i].sanitizar
+    ]
+    faltantes = [None] * total
+
+    def extrair(partes):
+        if len(partes) < total:
+            partes = list(partes) + faltantes[len(partes):]
+        valores = list(pegar(partes))
+        for saida, ajustar in ajustes:
+            valores[saida] = ajustar(valores[saida])
+        return valores
+
+    posicoes = {coluna: i for i, coluna in enumerate(colunas_campos)}
+
+    return RegistroCompilado(
+        reg, especificacao.tabela, colunas, posicoes, extrair, especificacao.derivar,
+        tuple(especificacao.contexto), posicoes.get(especificacao.chave),
+        sqlInsercao(especificacao.tabela, colunas)
+    )
+
+REGISTROS = {reg: compilarRegistro(reg, especificacao) for reg, especificacao in REGISTROS_SPED.items()}
@@ -1,64 +1,165 @@
 import traceback
-from utils.siglas import obterUF
-from utils.sanitizacao import truncar, corrigirUnidade, corrigir_ind_mov, corrigir_cst_icms, TAMANHOS_MAXIMOS, calcular_periodo, validar_estrutura_c170
+from db.conexao import conectarBanco, fecharBanco
+from db.criarTabelas import criar_tabela_sequencias
+from utils.configuracao import obterConfigInt
+from .carregadores import carregarLote, CARREGADOR_C170
+from .registros import REGISTROS, sqlInsercao
+from .arquivos import confirmarArquivo, periodoCarregado, STATUS_PROCESSANDO, STATUS_CONCLUIDO
+from utils.sanitizacao import calcular_periodo
 
 UNIDADE_PADRAO = "UN"
-
-async def salvarDados(conteudo, cursor, conexao, empresa_id, janela=None):
-    linhas = conteudo 
-    
-    dt_ini_0000 = None
-    for linha in linhas:
-        if linha.startswith("|0000|"):
-            partes = linha.split('|')[1:-1]
-            partes += [None] * (15 - len(partes))
-            dt_ini_0000 = partes[3]
-            periodo = calcular_periodo(dt_ini_0000)
-
-            cursor.execute("SELECT COUNT(*) FROM `0000` WHERE periodo = %s AND empresa_id = %s", (periodo, empresa_id))
-                           
-            if cursor.fetchone()[0] > 0:
-                cursor.execute("SELECT COUNT(*) FROM c170 WHERE periodo = %s AND empresa_id = %s", (periodo, empresa_id))
-                count_c170 = cursor.fetchone()[0]
-                raise ValueError(f"SPED do período {periodo} já foi processado anteriormente. {count_c170} itens já existem no banco.")
-            break
-    
-    if dt_ini_0000 is None:
-        raise ValueError("Não foi possível encontrar o registro 0000 nos dados fornecidos.")
-    
-    print(f"[DEBUG] Iniciando processamento de {len(linhas)} linhas")
-    
-    contadores = {"0000": 0, "0150": 0, "0200": 0, "C100": 0, "C170": 0, "salvos": 0, "erros": 0, "existentes": 0}
-    lote_0000, lote_0150, lote_0200, lote_c100, lote_c170 = [], [], [], [], []
-    registros_processados = set()
+TAMANHO_LOTE = 5000
+
+# Os ids de c100 são sempre reservados em blocos na tabela `sequencias` e atribuídos
+# em Python, permitindo gravar C100 e C170 juntos em lote. Não há mais inserção pelo
+# AUTO_INCREMENT: uma carga assim poderia pegar ids de um bloco já reservado por
+# outra carga em andamento.
+BLOCO_IDS_C100 = obterConfigInt('BLOCO_IDS_C100', 10000)
+
+C100 = REGISTROS['C100']
+C170 = REGISTROS['C170']
+C190 = REGISTROS['C190']
+DOCUMENTOS = ('C100', 'C170', 'C190')
+SQL_INSERIR_C100_COM_ID = sqlInsercao(C100.tabela, ('id',) + C100.colunas)
+
+_sequencias_verificadas = False
+
+class PeriodoJaCarregado(ValueError):
+    """O 0000 do arquivo é de um período/filial que já está no banco."""
+    def __init__(self, mensagem, periodo, filial):
+        super().__init__(mensagem)
+        self.periodo = periodo
+        self.filial = filial
+
+def reservarIds(tabela, quantidade):
+    """
+    Reserva `quantidade` ids consecutivos para `tabela` e devolve o primeiro.
+    Usa uma conexão própria, confirmada na hora, para não segurar o lock da
+    sequência até o commit da carga.
+    """
+    global _sequencias_verificadas
+    conexao = conectarBanco()
+    cursor = conexao.cursor()
+    try:
+        if not _sequencias_verificadas:
+            criar_tabela_sequencias(cursor)
+            _sequencias_verificadas = True
+
+        cursor.execute("INSERT IGNORE INTO sequencias (nome, proximo) VALUES (%s, 1)", (tabela,))
+        cursor.execute(f"""
+            UPDATE sequencias
+            SET proximo = LAST_INSERT_ID(GREATEST(proximo, (SELECT COALESCE(MAX(id), 0) + 1 FROM `{tabela}`)) + %s)
+            WHERE nome = %s
+        """, (quantidade, tabela))
+        cursor.execute("SELECT LAST_INSERT_ID()")
+        fim = cursor.fetchone()[0]
+        conexao.commit()
+        print(f"[DEBUG] Reservados ids {fim - quantidade} a {fim - 1} para {tabela}")
+        return fim - quantidade
+    finally:
+        cursor.close()
+        fecharBanco(conexao)
+
+def carregarIndiceExistentes(cursor, empresa_id, periodo):
+    """
+    Carrega de uma vez as chaves já gravadas para (empresa_id, periodo), para que
+    as duplicidades sejam resolvidas em memória sem um SELECT por registro.
+    """
+    indice = {'0150': set(), '0200': set(), 'c100_chave': {}, 'c100_doc': {}, 'c100_num': {}, 'c170': set(), 'c190': set()}
+
+    cursor.execute("SELECT cod_part FROM `0150` WHERE empresa_id = %s AND periodo = %s", (empresa_id, periodo))
+    indice['0150'].update(row[0] for row in cursor.fetchall())
+
+    cursor.execute("SELECT cod_item FROM `0200` WHERE empresa_id = %s AND periodo = %s", (empresa_id, periodo))
+    indice['0200'].update(row[0] for row in cursor.fetchall())
+
+    cursor.execute("""
+        SELECT id, chv_nfe, num_doc, cod_part FROM c100
+        WHERE empresa_id = %s AND periodo = %s
+        ORDER BY id
+    """, (empresa_id, periodo))
+    for id_c100, chv_nfe, num_doc, cod_part in cursor.fetchall():
+        registrarC100(indice, id_c100, chv_nfe, num_doc, cod_part)
+
+    cursor.execute("""
+        SELECT id_c100, num_item, cod_item FROM c170
+        WHERE empresa_id = %s AND periodo = %s
+    """, (empresa_id, periodo))
+    indice['c170'].update(cursor.fetchall())
+
+    cursor.execute("""
+        SELECT id_c100, cst_icms, cfop, aliq_icms FROM c190
+        WHERE empresa_id = %s AND periodo = %s
+    """, (empresa_id, periodo))
+    indice['c190'].update(cursor.fetchall())
+
+    print(f"[DEBUG] Índice de existentes {periodo}: {len(indice['0150'])} 0150, {len(indice['0200'])} 0200, "
+          f"{len(indice['c100_chave']) + len(indice['c100_doc'])} C100, {len(indice['c170'])} C170, "
+          f"{len(indice['c190'])} C190")
+    return indice
+
+def registrarC100(indice, id_c100, chv_nfe, num_doc, cod_part):
+    if chv_nfe:
+        indice['c100_chave'].setdefault(chv_nfe, id_c100)
+    if num_doc:
+        indice['c100_num'].setdefault(num_doc, id_c100)
+        if cod_part:
+            indice['c100_doc'].setdefault((num_doc, cod_part), id_c100)
+
+def buscarC100(indice, chv_nfe, num_doc, cod_part):
+    if chv_nfe:
+        return indice['c100_chave'].get(chv_nfe)
+    if num_doc:
+        if cod_part:
+            return indice['c100_doc'].get((num_doc, cod_part))
+        return indice['c100_num'].get(num_doc)
+    return None
+
+async def salvarDados(registros, cursor, conexao, empresa_id, janela=None, verificar_periodo=True,
+                      id_arquivo=None, retomar_de=0, periodos=None, aoLerParticipantes=None):
+    """
+    Consome os registros gerados por lerRegistros (listas ou tuplas, com cada C100 trazendo
+    seus C170/C190) e grava no banco em lotes.
+    O mapeamento de cada registro vem dos extratores compilados em `registros.py`.
+    A cada TAMANHO_LOTE linhas pendentes a carga é confirmada (commit) no início de um C100,
+    junto com o ponto de retomada do arquivo `id_arquivo` em sped_arquivos, então o consumo
+    de memória depende do tamanho do lote e não do tamanho do arquivo.
+    Com retomar_de=n os n primeiros registros, já confirmados, são apenas lidos: o 0000
+    ainda define período e filial, mas nada é gravado novamente.
+    Com verificar_periodo=False o 0000 não é checado contra períodos já carregados.
+    Se `periodos` (set) for informado, recebe os períodos dos 0000 lidos.
+    Se `aoLerParticipantes` for informado, é chamado uma vez, ao fim do bloco 0, com
+    os CNPJs dos 0150 lidos (para a consulta antecipada dos fornecedores).
+    """
+    print("[DEBUG] Iniciando processamento dos registros em fluxo")
+
+    contadores = {reg: 0 for reg in REGISTROS}
+    contadores.update({"salvos": 0, "erros": 0, "existentes": 0})
+    carga = {C170.tabela: {"linhas": 0, "segundos": 0.0}, C190.tabela: {"linhas": 0, "segundos": 0.0}}
+    lotes = {reg: [] for reg in REGISTROS}
+    lote_c100, lote_c170, lote_c190 = lotes['C100'], lotes['C170'], lotes['C190']
+    indices = {}
+    indice = None
+    ids_c100 = {"proximo": 0, "limite": 0}
+    contexto = {"empresa_id": empresa_id}
+    pendentes = {"linhas": 0}
+    lidos = 0
+
+    pos_dt_ini = REGISTROS['0000'].posicoes['dt_ini']
+    pos_cnpj = REGISTROS['0000'].posicoes['cnpj']
+    pos_ind_oper = C100.posicoes['ind_oper']
+    pos_cod_part = C100.posicoes['cod_part']
+    pos_num_doc = C100.posicoes['num_doc']
+    pos_chv_nfe = C100.posicoes['chv_nfe']
+    pos_num_item = C170.posicoes['num_item']
+    pos_cod_item = C170.posicoes['cod_item']
+    pos_c190 = [C190.posicoes[c] for c in ('cst_icms', 'cfop', 'aliq_icms')]
+    pos_cnpj_0150 = REGISTROS['0150'].posicoes['cnpj']
+    participantes = set() if aoLerParticipantes else None
 
     dt_ini_0000 = None
+    periodo_verificado = not verificar_periodo
     filial = None
-    num_doc = None
-    ultimo_num_doc = None
-    mapa_documentos = {}
-
-    def verificarRegistroExistente(cursor, tabela, condicoes, retornar_id=False):
-        if not condicoes:
-            raise ValueError("As condições para verificação não podem estar vazias.")
-
-        where_clause = " AND ".join([f"`{campo}` = %s" for campo in condicoes])
-        valores = list(condicoes.values())
-
-        tabela_escapada = f"`{tabela}`"
-
-        if retornar_id:
-            sql = f"SELECT `id` FROM {tabela_escapada} WHERE {where_clause}"
-        else:
-            sql = f"SELECT COUNT(*) FROM {tabela_escapada} WHERE {where_clause}"
-
-        cursor.execute(sql, valores)
-        resultado = cursor.fetchone()
-
-        if retornar_id:
-            return resultado[0] if resultado else None
-        else:
-            return resultado[0] > 0
 
     def inserir(sql, lote, descricao):
         if not lote: return
@@ -81,284 +182,216 @@ async def salvarDados(conteudo, cursor, conexao, empresa_id, janela=None):
             else:
                 print(f"[ERRO] Falha ao inserir {descricao}: {e}")
                 contadores["erros"] += len(lote)
+        finally:
+            lote.clear()
+
+    def carregarFilhos(registro, lote):
+        if not lote: return
+        try:
+            carga[registro.tabela]["segundos"] += carregarLote(cursor, registro.tabela, registro.colunas, lote)
+            carga[registro.tabela]["linhas"] += len(lote)
+            contadores["salvos"] += len(lote)
+        except Exception as e:
+            contadores["erros"] += len(lote)
+            print(f"[ERRO] Falha no lote {registro.reg} com {len(lote)} itens: {e}")
+        finally:
+            lote.clear()
+
+    def proximoIdC100():
+        if ids_c100["proximo"] >= ids_c100["limite"]:
+            ids_c100["proximo"] = reservarIds('c100', BLOCO_IDS_C100)
+            ids_c100["limite"] = ids_c100["proximo"] + BLOCO_IDS_C100
+        id_c100 = ids_c100["proximo"]
+        ids_c100["proximo"] += 1
+        return id_c100
+
+    def descarregarDocumentos():
+        # C170/C190 apontam para os ids reservados do lote de C100: se o lote de notas
+        # não for gravado inteiro, os itens não são carregados e a carga falha (o
+        # rollback de quem chamou descarta o lote e o ponto de retomada não avança).
+        if lote_c100:
+            try:
+                cursor.executemany(SQL_INSERIR_C100_COM_ID, lote_c100)
+            except Exception as e:
+                quantidade = len(lote_c100)
+                for lote in (lote_c100, lote_c170, lote_c190):
+                    lote.clear()
+                raise RuntimeError(f"Falha ao gravar o lote de {quantidade} C100: {e}") from e
+            contadores["salvos"] += len(lote_c100)
+            lote_c100.clear()
+        carregarFilhos(C170, lote_c170)
+        carregarFilhos(C190, lote_c190)
+
+    def confirmar(registros_confirmados, status=STATUS_PROCESSANDO):
+        for reg, registro in REGISTROS.items():
+            if reg not in DOCUMENTOS:
+                inserir(registro.sql, lotes[reg], f"|{reg}|")
+        descarregarDocumentos()
+        # Linhas perdidas neste lote: não avança o ponto de retomada nem marca o
+        # arquivo como concluído; quem chamou desfaz o lote e marca o arquivo com erro.
+        if contadores["erros"]:
+            raise RuntimeError(f"{contadores['erros']} registro(s) não gravado(s); carga interrompida na linha {registros_confirmados}.")
+        if id_arquivo:
+            confirmarArquivo(cursor, id_arquivo, registros_confirmados, contexto.get("periodo"), contexto.get("filial"), status)
+        conexao.commit()
+        pendentes["linhas"] = 0
 
     try:
-        for linha in linhas:
-            if not linha.strip(): continue
-            partes = linha.split('|')[1:-1]
-
-            if linha.startswith("|0000|"):
-                partes += [None] * (15 - len(partes))
-                dt_ini_0000 = partes[3]
-                cnpj = partes[6]
+        for partes in registros:
+            ordinal = lidos
+            lidos += 1
+            if not partes: continue
+            reg = partes[0]
+            registro = REGISTROS.get(reg)
+            if registro is None:
+                continue
+
+            # Antes do ponto de retomada: os 0150 já gravados também entram na consulta
+            # antecipada, senão a retomada consultaria só parte dos participantes.
+            if participantes is not None:
+                if reg == "0150":
+                    cnpj_participante = registro.extrair(partes)[pos_cnpj_0150]
+                    if cnpj_participante:
+                        participantes.add(cnpj_participante)
+                elif reg[0] != "0":
+                    aoLerParticipantes(participantes)
+                    participantes = None
+
+            if ordinal < retomar_de and reg != "0000":
+                continue
+
+            if reg != "0000" and dt_ini_0000 is None:
+                raise ValueError("Não foi possível encontrar o registro 0000 nos dados fornecidos.")
+
+            if reg == "C100":
+                _, partes, filhos = partes
+            valores = registro.extrair(partes)
+
+            if reg == "0000":
+                dt_ini_0000 = valores[pos_dt_ini]
+                cnpj = valores[pos_cnpj]
                 filial = cnpj[8:12] if cnpj else '0000'
                 periodo = calcular_periodo(dt_ini_0000)
-                partes += [filial, calcular_periodo(dt_ini_0000), empresa_id]
-                lote_0000.append(partes)
-                contadores["0000"] += 1
-
-            elif linha.startswith("|0150|"):
-                partes += [None] * (13 - len(partes))
-                municipio = partes[7]
-                cod_uf = municipio[:2] if municipio else None
-                uf = obterUF(cod_uf)
-                pj_pf = "PF" if partes[4] is None else "PJ"
-                periodo = calcular_periodo(dt_ini_0000)
-                cod_part = partes[1]
-                partes += [cod_uf, uf, pj_pf, periodo, empresa_id]
-                if verificarRegistroExistente(cursor, '0150', {
-                    'cod_part': cod_part,
-                    'periodo': periodo,
-                    'empresa_id': empresa_id
-                }):
-                    contadores["existentes"] += 1
-                else:
-                    lote_0150.append(partes)
-                    contadores["0150"] += 1
-
-            elif linha.startswith("|0200|"):
-                partes += [None] * (13 - len(partes))
-                partes[1] = truncar(partes[1], TAMANHOS_MAXIMOS['cod_item'])
-                partes[2] = truncar(partes[2], TAMANHOS_MAXIMOS['descr_item'])
-                partes[5] = truncar(partes[5], TAMANHOS_MAXIMOS['unid'])
-                periodo = calcular_periodo(dt_ini_0000)
-                cod_item = partes[1]
-                partes.append(periodo)
-                partes.append(empresa_id)
-
-                if verificarRegistroExistente(cursor, '0200', {
-                    'cod_item': cod_item,
-                    'periodo': periodo,
-                    'empresa_id': empresa_id
-                }):
-                    contadores["existentes"] += 1
-                else:
-                    lote_0200.append(partes)
-                    contadores["0200"] += 1
-
-            elif linha.startswith("|C100|"):
-                partes += [None] * (29 - len(partes))
-                ind_oper, cod_part, num_doc, chv_nfe = partes[1], partes[4], partes[7], partes[9]
-                periodo = calcular_periodo(dt_ini_0000)
 
-                condicoes = {'periodo': periodo, 'empresa_id': empresa_id}
-                if chv_nfe:
-                    condicoes['chv_nfe'] = chv_nfe
-                elif num_doc:
-                    condicoes['num_doc'] = num_doc
-                    if cod_part:
-                        condicoes['cod_part'] = cod_part
-                
-                id_c100_existente = verificarRegistroExistente(cursor, 'c100', condicoes, retornar_id=True)
-                
-                if id_c100_existente:
+                if not periodo_verificado:
+                    if periodoCarregado(cursor, empresa_id, periodo, filial):
+                        cursor.execute(
+                            "SELECT COUNT(*) FROM c170 WHERE periodo = %s AND empresa_id = %s AND filial = %s",
+                            (periodo, empresa_id, filial)
+                        )
+                        count_c170 = cursor.fetchone()[0]
+                        raise PeriodoJaCarregado(
+                            f"SPED do período {periodo} (filial {filial}) já foi processado anteriormente. {count_c170} itens já existem no banco.",
+                            periodo, filial
+                        )
+                    periodo_verificado = True
+
+                if periodo not in indices:
+                    indices[periodo] = carregarIndiceExistentes(cursor, empresa_id, periodo)
+                indice = indices[periodo]
+                contexto["filial"] = filial
+                contexto["periodo"] = periodo
+                if periodos is not None:
+                    periodos.add(periodo)
+
+                if ordinal >= retomar_de:
+                    lotes[reg].append(valores + [contexto[c] for c in registro.contexto])
+                    pendentes["linhas"] += 1
+                    contadores[reg] += 1
+
+            elif reg == "C100":
+                if pendentes["linhas"] >= TAMANHO_LOTE:
+                    confirmar(ordinal)
+
+                ind_oper, cod_part = valores[pos_ind_oper], valores[pos_cod_part]
+                num_doc, chv_nfe = valores[pos_num_doc], valores[pos_chv_nfe]
+
+                id_c100 = buscarC100(indice, chv_nfe, num_doc, cod_part)
+
+                if id_c100:
                     contadores["existentes"] += 1
-                    if num_doc:
-                        mapa_documentos[num_doc] = {
-                            "ind_oper": ind_oper,
-                            "cod_part": cod_part,
-                            "chv_nfe": chv_nfe,
-                            "id_c100": id_c100_existente
-                        }
-                        ultimo_num_doc = num_doc
                 else:
-                    registro = [periodo] + partes + [filial, empresa_id]
-
-                    cursor.execute("""
-                        INSERT INTO c100 (
-                            periodo, reg, ind_oper, ind_emit, cod_part, cod_mod, cod_sit, ser, num_doc, chv_nfe,
-                            dt_doc, dt_e_s, vl_doc, ind_pgto, vl_desc, vl_abat_nt, vl_merc, ind_frt, vl_frt, vl_seg,
-                            vl_out_da, vl_bc_icms, vl_icms, vl_bc_icms_st, vl_icms_st, vl_ipi, vl_pis, vl_cofins,
-                            vl_pis_st, vl_cofins_st, filial, empresa_id
-                        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
-                                %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
-                                %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
-                                %s, %s)
-                    """, registro)
-
-                    id_c100 = cursor.lastrowid
-
-                    if num_doc:
-                        mapa_documentos[num_doc] = {
-                            "ind_oper": ind_oper,
-                            "cod_part": cod_part,
-                            "chv_nfe": chv_nfe,
-                            "id_c100": id_c100
-                        }
-                        ultimo_num_doc = num_doc
-                    contadores["C100"] += 1
-
-            elif linha.startswith("|C170|"):
-                partes += [None] * (39 - len(partes))
-                if len(partes) < 10:
-                    continue
+                    linha = valores + [contexto[c] for c in registro.contexto]
 
-                if not ultimo_num_doc:
-                    print(f"[DEBUG CRÍTICO] ultimo_num_doc indefinido antes do registro C170: linha={linha}")
-                    continue
+                    id_c100 = proximoIdC100()
+                    lote_c100.append([id_c100] + linha)
 
-                dados_doc = mapa_documentos.get(ultimo_num_doc)
-                if not dados_doc:
-                    print(f"[WARN] Documento {ultimo_num_doc} não encontrado no mapa. Ignorando linha C170.")
-                    continue
-
-                ind_oper = dados_doc["ind_oper"]
-                cod_part = dados_doc["cod_part"]
-                chv_nfe = dados_doc["chv_nfe"]
-                id_c100 = dados_doc.get("id_c100")
+                    registrarC100(indice, id_c100, chv_nfe, num_doc, cod_part)
+                    pendentes["linhas"] += 1
+                    contadores[reg] += 1
 
                 if not id_c100:
-                    print(f"[WARN] id_c100 não encontrado para nota {ultimo_num_doc}. Ignorando C170.")
+                    print(f"[WARN] id_c100 não encontrado para nota {num_doc}. Ignorando {len(filhos)} registro(s) filho(s).")
                     continue
 
-                num_item = partes[2]
-                cod_item = truncar(partes[3], TAMANHOS_MAXIMOS['cod_item'])
-            
-                if verificarRegistroExistente(cursor, 'c170', {
-                    'id_c100': id_c100,
-                    'num_item': num_item,
-                    'cod_item': cod_item
-                }):
-                    contadores["existentes"] += 1
-                    continue
-                
-                descr_compl = truncar(partes[4], TAMANHOS_MAXIMOS['descr_compl']) 
-                qtd = partes[5]
-                unid = truncar(corrigirUnidade(partes[6]), TAMANHOS_MAXIMOS['unid'])
-                vl_item = partes[7]
-                vl_desc = partes[8]
-                ind_mov = corrigir_ind_mov(partes[9])
-                cst_icms = corrigir_cst_icms(partes[10])
-                cfop = partes[11]
-                cod_nat = truncar(partes[37], TAMANHOS_MAXIMOS['cod_nat'])
-
-                dados = [
-                    calcular_periodo(dt_ini_0000),  # periodo
-                    "C170",                         # reg fixo
-                    num_item,
-                    cod_item,
-                    descr_compl,
-                    qtd,
-                    unid,
-                    vl_item,
-                    vl_desc,
-                    ind_mov,
-                    cst_icms,
-                    cfop,
-                    cod_nat,
-                    partes[12],  # vl_bc_icms
-                    partes[13],  # aliq_icms
-                    partes[14],  # vl_icms
-                    partes[15],  # vl_bc_icms_st
-                    partes[16],  # aliq_st
-                    partes[17],  # vl_icms_st
-                    partes[18],  # ind_apur
-                    partes[19],  # cst_ipi
-                    partes[20],  # cod_enq
-                    partes[21],  # vl_bc_ipi
-                    partes[22],  # aliq_ipi
-                    partes[23],  # vl_ipi
-                    partes[24],  # cst_pis
-                    partes[25],  # vl_bc_pis
-                    partes[26],  # aliq_pis
-                    partes[27],  # quant_bc_pis
-                    partes[28],  # aliq_pis_reais
-                    partes[29],  # vl_pis
-                    partes[30],  # cst_cofins
-                    partes[31],  # vl_bc_cofins
-                    partes[32],  # aliq_cofins
-                    partes[33],  # quant_bc_cofins
-                    partes[34],  # aliq_cofins_reais
-                    partes[35],  # vl_cofins
-                    truncar(partes[36], TAMANHOS_MAXIMOS['cod_cta']),
-                    partes[37],  # vl_abat_nt
-                    id_c100,
-                    filial,
-                    ind_oper,
-                    cod_part,
-                    ultimo_num_doc,
-                    chv_nfe,
-                    empresa_id
-                ]
-
-                if len(dados) != 46:
-                    print(f"[ERRO] Registro com tamanho inválido: {len(dados)} (esperado: 46)")
-                    continue
+                contexto["id_c100"] = id_c100
+                contexto["ind_oper"] = ind_oper
+                contexto["cod_part"] = cod_part
+                contexto["num_doc"] = num_doc
+                contexto["chv_nfe"] = chv_nfe
+
+                for filho in filhos:
+                    if filho[0] == "C170":
+                        valores = C170.extrair(filho)
+                        cod_item = valores[pos_cod_item]
+                        chave_c170 = (id_c100, valores[pos_num_item], cod_item)
+                        if chave_c170 in indice['c170']:
+                            contadores["existentes"] += 1
+                            continue
+
+                        lote_c170.append(valores + [contexto[c] for c in C170.contexto])
+                        indice['c170'].add(chave_c170)
+                        pendentes["linhas"] += 1
+                        contadores["C170"] += 1
+
+                    elif filho[0] == "C190":
+                        valores = C190.extrair(filho)
+                        chave_c190 = (id_c100, *[valores[i] for i in pos_c190])
+                        if chave_c190 in indice['c190']:
+                            contadores["existentes"] += 1
+                            continue
+
+                        lote_c190.append(valores + [contexto[c] for c in C190.contexto])
+                        indice['c190'].add(chave_c190)
+                        pendentes["linhas"] += 1
+                        contadores["C190"] += 1
 
-                if not validar_estrutura_c170(dados):
-                    continue
-
-                registro_id = f"{filial}_{ultimo_num_doc}_{cod_item}"
-                if registro_id in registros_processados:
-                    continue
-
-                lote_c170.append(dados)
-                registros_processados.add(registro_id)
-                contadores["C170"] += 1
-
-        inserir("""
-            INSERT INTO `0000` (reg, cod_ver, cod_fin, dt_ini, dt_fin, nome, cnpj, cpf, uf, ie, cod_num, im, suframa,
-            ind_perfil, ind_ativ, filial, periodo, empresa_id)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """, lote_0000, "|0000|")
-
-        inserir("""
-            INSERT INTO `0150` (reg, cod_part, nome, cod_pais, cnpj, cpf, ie, cod_mun, suframa, ende, num, compl, bairro,
-            cod_uf, uf, pj_pf, periodo, empresa_id)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """, lote_0150, "|0150|")
-
-        inserir("""
-            INSERT INTO `0200` (reg, cod_item, descr_item, cod_barra, cod_ant_item, unid_inv, tipo_item, cod_ncm,
-            ex_ipi, cod_gen, cod_list, aliq_icms, cest, periodo, empresa_id)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """, lote_0200, "|0200|")
-
-        inserir("""
-            INSERT INTO c100 (
-                periodo, reg, ind_oper, ind_emit, cod_part, cod_mod, cod_sit, ser, num_doc, chv_nfe,
-                dt_doc, dt_e_s, vl_doc, ind_pgto, vl_desc, vl_abat_nt, vl_merc, ind_frt, vl_frt, vl_seg,
-                vl_out_da, vl_bc_icms, vl_icms, vl_bc_icms_st, vl_icms_st, vl_ipi, vl_pis, vl_cofins,
-                vl_pis_st, vl_cofins_st, filial, empresa_id
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
-                     %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """, lote_c100, "|C100|")
-
-        for i in range(0, len(lote_c170), 5000):
-            lote = lote_c170[i:i+5000]
-            try:
-                cursor.executemany("""
-                    INSERT INTO c170 (
-                        periodo, reg, num_item, cod_item, descr_compl, qtd, unid, vl_item, vl_desc,
-                        ind_mov, cst_icms, cfop, cod_nat, vl_bc_icms, aliq_icms, vl_icms, vl_bc_icms_st,
-                        aliq_st, vl_icms_st, ind_apur, cst_ipi, cod_enq, vl_bc_ipi, aliq_ipi, vl_ipi,
-                        cst_pis, vl_bc_pis, aliq_pis, quant_bc_pis, aliq_pis_reais, vl_pis, cst_cofins,
-                        vl_bc_cofins, aliq_cofins, quant_bc_cofins, aliq_cofins_reais, vl_cofins, cod_cta,
-                        vl_abat_nt, id_c100, filial, ind_oper, cod_part, num_doc, chv_nfe, empresa_id
-                    ) VALUES (
-                        %s, %s, %s, %s, %s, %s, %s, %s, %s,
-                        %s, %s, %s, %s, %s, %s, %s, %s,
-                        %s, %s, %s, %s, %s, %s, %s, %s,
-                        %s, %s, %s, %s, %s, %s, %s,
-                        %s, %s, %s, %s, %s, %s, %s,
-                        %s, %s, %s, %s, %s, %s, %s
-                    )
-                """, lote)
-                contadores["salvos"] += len(lote)
-
-                cursor.execute("SELECT COUNT(*) FROM c170 WHERE periodo = %s AND empresa_id = %s",
-                               (calcular_periodo(dt_ini_0000), empresa_id))
-                total_registros = cursor.fetchone()[0]
-                print(f"[DEBUG] Total de registros em c170 após inserção: {total_registros}")
-            except Exception as e:
-                contadores["erros"] += len(lote)
-                print(f"[ERRO] Falha no lote C170 {i}-{i+len(lote)}: {e}")
-
-        conexao.commit()
+            else:
+                existentes = indice.get(reg)
+                if existentes is not None:
+                    chave = valores[registro.chave]
+                    if chave in existentes:
+                        contadores["existentes"] += 1
+                        continue
+                    existentes.add(chave)
+
+                if registro.derivar:
+                    valores += registro.derivar(valores)
+                valores += [contexto[c] for c in registro.contexto]
+
+                lote = lotes[reg]
+                lote.append(valores)
+                pendentes["linhas"] += 1
+                contadores[reg] += 1
+                if len(lote) >= TAMANHO_LOTE:
+                    inserir(registro.sql, lote, f"|{reg}|")
+
+        if dt_ini_0000 is None:
+            raise ValueError("Não foi possível encontrar o registro 0000 nos dados fornecidos.")
+
+        if participantes:
+            aoLerParticipantes(participantes)
+        confirmar(lidos, STATUS_CONCLUIDO)
+        for tabela, totais in carga.items():
+            if totais["segundos"] > 0:
+                print(f"[CARGA] {tabela} via {CARREGADOR_C170}: {totais['linhas']} linhas, "
+                      f"{totais['linhas'] / totais['segundos']:,.0f} linhas/s")
         print(f"[FINAL] Processamento concluído: {contadores['salvos']} salvos, {contadores['erros']} erros.")
         return f"Processamento finalizado e dados salvos no banco."
 
+    except ValueError:
+        raise
     except Exception as e:
         print("[FATAL] Erro durante o salvamento:", e)
         print(traceback.format_exc())
-        return f"Erro geral ao salvar: {e}"
\ No newline at end of file
+        return f"Erro geral ao salvar: {e}"
@@ -1,6 +1,7 @@
 import asyncio
 from PySide6.QtCore import QObject, Signal, QEventLoop
 from db.conexao import conectarBanco, fecharBanco
+from services.spedService.periodos import filtroPeriodos
 
 class SinalPopup(QObject):
     abrir_popup_signal = Signal(int, object)
@@ -61,13 +62,14 @@ async def verificaoPopupAliquota(empresa_id, janela_pai=None):
         sinal_popup._popup_ativo = False
         print("[INFO] Lock do popup liberado")
 
-async def preencherTributacao(empresa_id, parent=None):
+async def preencherTributacao(empresa_id, parent=None, periodos=None):
     print(f"[VERIFICAÇÃO] Preenchendo cadastro_tributacao com produtos da empresa_id={empresa_id}")
+    filtro, parametros_periodo = filtroPeriodos(periodos, 'c.periodo')
     conexao = conectarBanco()
     cursor = conexao.cursor()
 
     try:
-        cursor.execute("""
+        cursor.execute(f"""
             INSERT IGNORE INTO cadastro_tributacao (
                 empresa_id, codigo, produto, ncm, aliquota
             )
@@ -92,7 +94,7 @@ async def preencherTributacao(empresa_id, parent=None):
                 LEFT JOIN `0200` p 
                     ON c.cod_item = p.cod_item 
                     AND p.empresa_id = c.empresa_id
-                WHERE c.empresa_id = %s
+                WHERE c.empresa_id = %s{filtro}
                 AND c.cfop IN (
                         '1101', '1401', '1102', '1403', '1910', '1116',
                         '2101', '2102', '2401', '2403', '2910', '2116'
@@ -110,15 +112,17 @@ async def preencherTributacao(empresa_id, parent=None):
                 AND ct.produto = sub.produto
                 AND ct.ncm = sub.ncm
             )
-        """, (empresa_id,))
+        """, (empresa_id, *parametros_periodo))
 
         novos = cursor.rowcount
         conexao.commit()
         print(f"[OK] {novos} códigos únicos inseridos na tabela cadastro_tributacao.")
+        return novos
 
     except Exception as e:
         print(f"[ERRO] Falha ao preencher cadastro_tributacao: {e}")
         conexao.rollback()
+        return None
 
     finally:
         cursor.close()
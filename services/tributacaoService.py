@@ -1,5 +1,6 @@
 import pandas as pd
 import unicodedata
+from PySide6.QtCore import QThread, Signal
 from PySide6.QtWidgets import QFileDialog
 from db.conexao import conectarBanco, fecharBanco
 from utils.aliquota import formatarAliquota
@@ -14,6 +15,9 @@ COLUNAS_SINONIMAS = {
 
 COLUNAS_NECESSARIAS = ['CODIGO', 'PRODUTO', 'NCM', 'ALIQUOTA']
 
+# Linhas por INSERT na tabela temporária da importação
+LOTE_STAGING = 5000
+
 
 def normalizar_texto(texto):
     return unicodedata.normalize('NFKD', texto).encode('ASCII', 'ignore').decode().lower().replace('_', '').replace(' ', '')
@@ -35,7 +39,7 @@ def mapear_colunas(df):
     if all(col in colunas_encontradas for col in COLUNAS_NECESSARIAS):
         return colunas_encontradas
 
-    mensagem_error(f"Erro: Colunas esperadas não encontradas. Colunas atuais: {df.columns.tolist()}")
+    print(f"[ERRO] Colunas esperadas não encontradas. Colunas atuais: {df.columns.tolist()}")
     return None
 
 def carregar_planilha():
@@ -45,33 +49,42 @@ def carregar_planilha():
         return None
     return filename
 
+def categoria_por_aliquota(aliquota):
+    aliquota_str = str(aliquota).upper().replace('%', '').replace(',', '.').strip()
+    if aliquota_str in ["ISENTO", "ST", "SUBSTITUICAO", "0", "0.00"]:
+        return 'ST'
+    try:
+        aliquota_num = float(aliquota_str)
+        if aliquota_num in [17.00, 12.00, 4.00]:
+            return '20RegraGeral'
+        elif aliquota_num in [5.95, 4.20, 1.54]:
+            return '7CestaBasica'
+        elif aliquota_num in [10.20, 7.20, 2.63]:
+            return '12CestaBasica'
+        elif aliquota_num in [37.80, 30.39, 8.13]:
+            return '28BebidaAlcoolica'
+        else:
+            return 'regraGeral'
+    except ValueError:
+        return 'regraGeral'
+
+def texto_limpo(serie, nulo):
+    """Equivale a str(valor).strip() por linha: nulos viram o texto `nulo` ('nan' da planilha, 'None' do banco)."""
+    return serie.astype(object).fillna(nulo).astype(str).str.strip()
+
+def mapear_valores(serie, funcao):
+    """Aplica `funcao` uma vez por valor distinto e mapeia o resultado para a série inteira."""
+    return serie.map({valor: funcao(valor) for valor in serie.unique()})
+
 def preparar_dataframe(df, mapeamento, empresa_id):
     df = df.rename(columns=mapeamento)
 
-    df[mapeamento['ALIQUOTA']] = (
-        df[mapeamento['ALIQUOTA']].fillna('').astype(str).str.strip().apply(formatarAliquota)
+    # A planilha tem poucas alíquotas distintas: formatação e categoria são calculadas
+    # por valor distinto e aplicadas com map, em vez de linha a linha.
+    df[mapeamento['ALIQUOTA']] = mapear_valores(
+        df[mapeamento['ALIQUOTA']].fillna('').astype(str).str.strip(), formatarAliquota
     )
-
-    def categoria_por_aliquota(aliquota):
-        aliquota_str = str(aliquota).upper().replace('%', '').replace(',', '.').strip()
-        if aliquota_str in ["ISENTO", "ST", "SUBSTITUICAO", "0", "0.00"]:
-            return 'ST'
-        try:
-            aliquota_num = float(aliquota_str)
-            if aliquota_num in [17.00, 12.00, 4.00]:
-                return '20RegraGeral'
-            elif aliquota_num in [5.95, 4.20, 1.54]:
-                return '7CestaBasica'
-            elif aliquota_num in [10.20, 7.20, 2.63]:
-                return '12CestaBasica'
-            elif aliquota_num in [37.80, 30.39, 8.13]:
-                return '28BebidaAlcoolica'
-            else:
-                return 'regraGeral'
-        except ValueError:
-            return 'regraGeral'
-
-    df['categoriaFiscal'] = df[mapeamento['ALIQUOTA']].apply(categoria_por_aliquota)
+    df['categoriaFiscal'] = mapear_valores(df[mapeamento['ALIQUOTA']], categoria_por_aliquota)
 
     df = df.drop_duplicates(subset=[mapeamento['CODIGO'], mapeamento['PRODUTO'], mapeamento['NCM']])
 
@@ -81,105 +94,157 @@ def preparar_dataframe(df, mapeamento, empresa_id):
     df_resultado['empresa_id'] = empresa_id
     return df_resultado
 
+CHAVE_TRIBUTACAO = ['codigo', 'produto', 'ncm']
+
 def buscar_registros_existentes(cursor, empresa_id):
     cursor.execute("""
         SELECT codigo, produto, ncm, aliquota, categoriaFiscal FROM cadastro_tributacao
         WHERE empresa_id = %s
     """, (empresa_id,))
-    return {
-        (str(c).strip(), str(p).strip(), str(n).strip()): (str(a).strip(), str(cat).strip())
-        for c, p, n, a, cat in cursor.fetchall()
-    }
+    existentes = pd.DataFrame(
+        cursor.fetchall(), columns=CHAVE_TRIBUTACAO + ['aliquota_atual', 'categoria_atual'], dtype=object
+    )
+    for coluna in existentes.columns:
+        existentes[coluna] = texto_limpo(existentes[coluna], 'None')
+    # Chave repetida no banco: vale a última linha lida
+    return existentes.drop_duplicates(subset=CHAVE_TRIBUTACAO, keep='last')
 
 def processar_registros(df, mapeamento, registros_existentes, empresa_id):
-    novos, atualizacoes = [], []
-
-    for _, linha in df.iterrows():
-        codigo = str(linha[mapeamento['CODIGO']]).strip()
-        produto = str(linha[mapeamento['PRODUTO']]).strip()
-        ncm = str(linha[mapeamento['NCM']]).strip()
-        aliquota = str(linha[mapeamento['ALIQUOTA']]).strip()
-        categoria_fiscal = str(linha['categoriaFiscal']).strip()
-
-        chave = (codigo, produto, ncm)
-        registro_atual = registros_existentes.get(chave)
-
-        if not registro_atual:
-            novos.append((empresa_id, codigo, produto, ncm, aliquota, categoria_fiscal))
-        elif registro_atual != (aliquota, categoria_fiscal):
-            atualizacoes.append((aliquota, categoria_fiscal, empresa_id, codigo, produto, ncm))
-
-    novos = list(set(novos))
-    atualizacoes = list(set(atualizacoes))
+    planilha = pd.DataFrame({
+        'codigo': df[mapeamento['CODIGO']],
+        'produto': df[mapeamento['PRODUTO']],
+        'ncm': df[mapeamento['NCM']],
+        'aliquota': df[mapeamento['ALIQUOTA']],
+        'categoriaFiscal': df['categoriaFiscal'],
+    })
+    for coluna in planilha.columns:
+        planilha[coluna] = texto_limpo(planilha[coluna], 'nan')
+    planilha['empresa_id'] = empresa_id
+
+    comparacao = planilha.merge(registros_existentes, on=CHAVE_TRIBUTACAO, how='left', indicator=True)
+    existe = comparacao['_merge'] == 'both'
+    alterado = (comparacao['aliquota'] != comparacao['aliquota_atual']) | \
+               (comparacao['categoriaFiscal'] != comparacao['categoria_atual'])
+
+    novos = comparacao.loc[~existe, ['empresa_id', 'codigo', 'produto', 'ncm', 'aliquota', 'categoriaFiscal']]
+    atualizacoes = comparacao.loc[existe & alterado, ['aliquota', 'categoriaFiscal', 'empresa_id', 'codigo', 'produto', 'ncm']]
+
+    novos = list(novos.drop_duplicates().itertuples(index=False, name=None))
+    atualizacoes = list(atualizacoes.drop_duplicates().itertuples(index=False, name=None))
 
     return novos, atualizacoes
 
-def salvar_registros(cursor, novos, atualizacoes):
-    registros_pulou = 0
-
-    if novos:
-        for registro in novos:
-            try:
-                cursor.execute("""
-                    INSERT INTO cadastro_tributacao (empresa_id, codigo, produto, ncm, aliquota, categoriaFiscal)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                """, registro)
-            except Exception as e:
-                if "1062" in str(e):
-                    registros_pulou += 1
-                    continue
-                else:
-                    raise e
-
-        print(f"[DEBUG] {len(novos) - registros_pulou} novos registros inseridos.")
-        if registros_pulou > 0:
-            print(f"[DEBUG] {registros_pulou} registros duplicados ignorados.")
-
-    if atualizacoes:
-        cursor.executemany("""
-            UPDATE cadastro_tributacao
-            SET aliquota = %s, categoriaFiscal = %s
-            WHERE empresa_id = %s AND codigo = %s AND produto = %s AND ncm = %s
-        """, atualizacoes)
-        print(f"[DEBUG] {len(atualizacoes)} registros atualizados.")
-
-
-def enviar_tributacao(empresa_id, progress_bar):
-    progress_bar.setValue(0)
-    filename = carregar_planilha()
-    if not filename:
-        return
-
-    conexao = conectarBanco()
-    if not conexao:
-        mensagem_error("Erro ao conectar ao banco de dados.")
-        return
-
-    progress_bar.setValue(10)
-
+def salvar_registros(cursor, empresa_id, novos, atualizacoes, total):
+    """
+    Grava novos e alterados de uma vez: carga em lote numa tabela temporária e um
+    INSERT ... ON DUPLICATE KEY UPDATE (uniq_empresa_codigo_produto_ncm) para o
+    cadastro_tributacao. `total` é o número de linhas da planilha.
+    Devolve {'inseridos', 'atualizados', 'inalterados'}.
+    """
+    linhas = [(codigo, produto, ncm, aliquota, categoria) for _, codigo, produto, ncm, aliquota, categoria in novos]
+    linhas += [(codigo, produto, ncm, aliquota, categoria) for aliquota, categoria, _, codigo, produto, ncm in atualizacoes]
+    if not linhas:
+        return {'inseridos': 0, 'atualizados': 0, 'inalterados': total}
+
+    cursor.execute("DROP TEMPORARY TABLE IF EXISTS tmp_tributacao")
+    cursor.execute("""
+        CREATE TEMPORARY TABLE tmp_tributacao (
+            codigo VARCHAR(60),
+            produto VARCHAR(255),
+            ncm VARCHAR(20),
+            aliquota VARCHAR(10),
+            categoriaFiscal VARCHAR(40)
+        )
+    """)
     try:
-        df = pd.read_excel(filename, dtype=str)
-        mapeamento = mapear_colunas(df)
-        if not mapeamento:
+        for i in range(0, len(linhas), LOTE_STAGING):
+            cursor.executemany("""
+                INSERT INTO tmp_tributacao (codigo, produto, ncm, aliquota, categoriaFiscal)
+                VALUES (%s, %s, %s, %s, %s)
+            """, linhas[i:i + LOTE_STAGING])
+
+        cursor.execute("SELECT COUNT(*) FROM cadastro_tributacao WHERE empresa_id = %s", (empresa_id,))
+        antes = cursor.fetchone()[0]
+        cursor.execute("""
+            INSERT INTO cadastro_tributacao (empresa_id, codigo, produto, ncm, aliquota, categoriaFiscal)
+            SELECT %s, codigo, produto, ncm, aliquota, categoriaFiscal FROM tmp_tributacao
+            ON DUPLICATE KEY UPDATE aliquota = VALUES(aliquota), categoriaFiscal = VALUES(categoriaFiscal)
+        """, (empresa_id,))
+        cursor.execute("SELECT COUNT(*) FROM cadastro_tributacao WHERE empresa_id = %s", (empresa_id,))
+        inseridos = cursor.fetchone()[0] - antes
+    finally:
+        cursor.execute("DROP TEMPORARY TABLE IF EXISTS tmp_tributacao")
+
+    # Só vão para a tabela temporária linhas novas ou alteradas; o que não virou linha nova foi atualização
+    atualizados = len(linhas) - inseridos
+    contagem = {'inseridos': inseridos, 'atualizados': atualizados, 'inalterados': total - inseridos - atualizados}
+    print(f"[DEBUG] {inseridos} registros inseridos, {atualizados} atualizados, {contagem['inalterados']} inalterados.")
+    return contagem
+
+class TributacaoWorker(QThread):
+    progress = Signal(int)
+    finished = Signal(str)
+    erro = Signal(str)
+
+    def __init__(self, empresa_id, caminho_arquivo):
+        super().__init__()
+        self.empresa_id = empresa_id
+        self.caminho_arquivo = caminho_arquivo
+
+    def run(self):
+        conexao = conectarBanco()
+        if not conexao:
+            self.erro.emit("Erro ao conectar ao banco de dados.")
             return
+        cursor = None
 
-        df_preparado = preparar_dataframe(df, mapeamento, empresa_id)
-        cursor = conexao.cursor()
-        registros_existentes = buscar_registros_existentes(cursor, empresa_id)
-        novos, atualizacoes = processar_registros(df_preparado, mapeamento, registros_existentes, empresa_id)
-
-        salvar_registros(cursor, novos, atualizacoes)
-        conexao.commit()
-
-        total = len(novos) + len(atualizacoes)
-        mensagem_sucesso(f"Tributação enviada com sucesso! Total: {total} registros.")
-        print(f"[DEBUG] Total final processado: {total}")
-        progress_bar.setValue(100)
+        try:
+            self.progress.emit(10)
+            df = pd.read_excel(self.caminho_arquivo, dtype=str)
+            mapeamento = mapear_colunas(df)
+            if not mapeamento:
+                self.erro.emit(f"Erro: Colunas esperadas não encontradas. Colunas atuais: {df.columns.tolist()}")
+                return
+
+            self.progress.emit(40)
+            df_preparado = preparar_dataframe(df, mapeamento, self.empresa_id)
+            cursor = conexao.cursor()
+            registros_existentes = buscar_registros_existentes(cursor, self.empresa_id)
+            novos, atualizacoes = processar_registros(df_preparado, mapeamento, registros_existentes, self.empresa_id)
+
+            self.progress.emit(70)
+            contagem = salvar_registros(cursor, self.empresa_id, novos, atualizacoes, len(df_preparado))
+            conexao.commit()
+
+            self.progress.emit(100)
+            print(f"[DEBUG] Total final processado: {contagem}")
+            self.finished.emit(
+                f"Tributação enviada com sucesso! {contagem['inseridos']} inseridos, "
+                f"{contagem['atualizados']} atualizados, {contagem['inalterados']} inalterados."
+            )
+
+        except Exception as e:
+            conexao.rollback()
+            self.erro.emit(f"Ocorreu um erro: {str(e)}")
+        finally:
+            if cursor:
+                cursor.close()
+            fecharBanco(conexao)
+
+def enviar_tributacao(empresa_id, progress_bar, janela=None):
+    """Escolhe a planilha e importa em segundo plano; devolve o worker (quem chama guarda a referência)."""
+    progress_bar.setValue(0)
+    filename = carregar_planilha()
+    if not filename:
+        return None
 
-    except Exception as e:
-        conexao.rollback()
-        mensagem_error(f"Ocorreu um erro: {str(e)}")
-    finally:
+    def concluir(mensagem, exibir):
         progress_bar.setValue(0)
-        cursor.close()
-        fecharBanco(conexao)
+        exibir(mensagem, parent=janela)
+
+    worker = TributacaoWorker(empresa_id, filename)
+    worker.progress.connect(progress_bar.setValue)
+    worker.finished.connect(lambda mensagem: concluir(mensagem, mensagem_sucesso))
+    worker.erro.connect(lambda mensagem: concluir(mensagem, mensagem_error))
+    worker.start()
+    return worker
@@ -0,0 +1,96 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from services.spedService import materializacao
+from services.spedService.materializacao import COLUNAS_CLONE, calcularAliquotaResultado
+
+def item(id_c170, vl_item, vl_desc, aliquota_base, simples):
+    valores = dict(zip(COLUNAS_CLONE, [f"v{i}" for i in range(len(COLUNAS_CLONE))]))
+    valores.update(empresa_id=7, vl_item=vl_item, vl_desc=vl_desc)
+    return (id_c170, *valores.values(), aliquota_base, simples)
+
+class CursorFalso:
+    def __init__(self, itens):
+        self.itens = itens
+        self.sqls = []
+        self.gravados = []
+        self.rowcount = 0
+        self._resultado = []
+
+    def execute(self, sql, parametros=()):
+        self.sqls.append(sql)
+        if "MIN(id), MAX(id)" in sql:
+            self._resultado = [(1, 3)]
+        elif "FROM c170 c" in sql:
+            self._resultado = self.itens
+        else:
+            self._resultado = []
+        self.rowcount = 0
+
+    def executemany(self, sql, linhas):
+        self.sqls.append(sql)
+        self.gravados.extend(linhas)
+        self.rowcount = len(linhas)
+
+    def fetchone(self):
+        return self._resultado[0]
+
+    def fetchall(self):
+        return self._resultado
+
+    def close(self):
+        pass
+
+class ConexaoFalsa:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def cursor(self, **_):
+        return self._cursor
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+class CalcularAliquotaResultadoTest(unittest.TestCase):
+    def test_sem_simples_mantem_aliquota(self):
+        self.assertEqual(calcularAliquotaResultado('100,00', '10,00', '17,00%', 0), ('17,00%', 15.3))
+
+    def test_simples_soma_3_pontos(self):
+        self.assertEqual(calcularAliquotaResultado('50,00', '0,00', '12,00%', 1), ('15,00%', 7.5))
+
+    def test_simples_nao_ajusta_st(self):
+        self.assertEqual(calcularAliquotaResultado('50,00', '0,00', 'ST', 1), ('ST', 0.0))
+
+class MaterializacaoPythonTest(unittest.TestCase):
+    def materializar(self, resultado_python, itens):
+        cursor = CursorFalso(itens)
+        with mock.patch.object(materializacao, 'RESULTADO_PYTHON', resultado_python), \
+             mock.patch.object(materializacao, 'conectarBanco', lambda: ConexaoFalsa(cursor)), \
+             mock.patch.object(materializacao, 'fecharBanco', lambda conexao: None), \
+             mock.patch.object(materializacao, 'consultarEmLotes', lambda *args, **kwargs: iter(())):
+            total = asyncio.run(materializacao.materializarC170Clone(7))
+        return total, cursor
+
+    def test_resultado_python_calcula_e_grava_sem_funcoes_do_mysql_8(self):
+        total, cursor = self.materializar(True, [
+            item(1, '100,00', '10,00', '17,00%', 0),
+            item(2, '50,00', '0,00', '12,00%', 1),
+        ])
+
+        self.assertEqual(total, 2)
+        self.assertEqual([linha[-2:] for linha in cursor.gravados], [('17,00%', 15.3), ('15,00%', 7.5)])
+        self.assertEqual([len(linha) for linha in cursor.gravados], [len(COLUNAS_CLONE) + 2] * 2)
+        self.assertFalse(any("REGEXP_REPLACE" in sql or "NO_MERGE" in sql for sql in cursor.sqls))
+
+    def test_padrao_calcula_no_banco(self):
+        _, cursor = self.materializar(False, [])
+
+        self.assertTrue(any("INSERT IGNORE INTO c170_clone" in sql and "REGEXP_REPLACE" in sql for sql in cursor.sqls))
+        self.assertEqual(cursor.gravados, [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -135,7 +135,10 @@ class MainWindow(QtWidgets.QMainWindow):
             botao_frame.addWidget(btn)
 
     def _enviar_tributacao(self):
-        enviar_tributacao(self.empresa_id, self.progress_bar)
+        if getattr(self, 'tributacao_worker', None) and self.tributacao_worker.isRunning():
+            mensagem_aviso("A importação da tributação ainda está em andamento.")
+            return
+        self.tributacao_worker = enviar_tributacao(self.empresa_id, self.progress_bar, self)
 
     def _processar_sped(self):
         self.progress_bar.setValue(0)
@@ -0,0 +1,244 @@
+import argparse
+import csv
+import io
+import os
+import sqlite3
+import threading
+import time
+import zipfile
+from contextlib import contextmanager
+from utils.configuracao import diretorioDados, obterConfig
+
+# Base local (SQLite, só leitura no uso) montada a partir dos dados abertos do
+# CNPJ da Receita Federal, consultada antes da API. Guarda só o necessário:
+#   estabelecimento(cnpj, cnae, uf)   <- arquivos *ESTABELE* (Estabelecimentos0..9.zip)
+#   simples(cnpj_basico, simples)     <- arquivo *SIMPLES* (Simples.zip)
+# CNPJs são gravados como inteiros, em tabelas WITHOUT ROWID, para a base ficar
+# pequena e a busca ser uma leitura direta na chave primária.
+#
+#   python -m utils.baseReceita importar <pasta com os .zip ou .csv> [--uf CE] [--cnpjs lista.txt]
+#   python -m utils.baseReceita consultar <cnpj> [<cnpj> ...]
+
+# Colunas (sem cabeçalho, separador ';', latin-1) dos arquivos da Receita
+_EST_BASICO, _EST_ORDEM, _EST_DV, _EST_CNAE, _EST_UF = 0, 1, 2, 11, 19
+_SIMPLES_BASICO, _SIMPLES_OPCAO = 0, 1
+
+_LOTE_IMPORTACAO = 50000
+_LOTE_SQLITE = 500
+
+def caminhoPadrao():
+    return obterConfig('RECEITA_BASE_ARQUIVO') or os.path.join(diretorioDados(), 'receita_cnpj.sqlite3')
+
+class BaseReceita:
+    def __init__(self, caminho=None):
+        self.caminho = caminho or caminhoPadrao()
+
+    def existe(self):
+        return os.path.isfile(self.caminho)
+
+    @contextmanager
+    def _conectar(self):
+        conexao = sqlite3.connect(f"file:{self.caminho}?mode=ro", uri=True, timeout=30)
+        try:
+            yield conexao
+        finally:
+            conexao.close()
+
+    def get_many(self, cnpjs):
+        """{cnpj: (cnae, uf, simples)} para os CNPJs presentes na base; os demais não aparecem."""
+        numeros = {}
+        for cnpj in cnpjs:
+            if cnpj.isdigit() and len(cnpj) == 14:
+                numeros[int(cnpj)] = cnpj
+        encontrados = {}
+        chaves = list(numeros)
+        with self._conectar() as conexao:
+            for i in range(0, len(chaves), _LOTE_SQLITE):
+                lote = chaves[i:i + _LOTE_SQLITE]
+                marcadores = ', '.join(['?'] * len(lote))
+                linhas = conexao.execute(f"""
+                    SELECT e.cnpj, e.cnae, e.uf, s.simples
+                    FROM estabelecimento e
+                    LEFT JOIN simples s ON s.cnpj_basico = e.cnpj / 1000000
+                    WHERE e.cnpj IN ({marcadores})
+                """, lote)
+                for numero, cnae, uf, simples in linhas:
+                    encontrados[numeros[numero]] = (cnae, uf, "Sim" if simples else "Não")
+        return encontrados
+
+    def descrever(self):
+        with self._conectar() as conexao:
+            info = dict(conexao.execute("SELECT chave, valor FROM importacao"))
+            info['estabelecimentos'] = conexao.execute("SELECT COUNT(*) FROM estabelecimento").fetchone()[0]
+            info['simples'] = conexao.execute("SELECT COUNT(*) FROM simples").fetchone()[0]
+        return info
+
+_base = None
+_base_trava = threading.Lock()
+_base_avisada = False
+
+def obterBaseReceita():
+    """Base local da Receita, ou None se ainda não foi importada."""
+    global _base, _base_avisada
+    with _base_trava:
+        if _base is None:
+            base = BaseReceita()
+            if not base.existe():
+                if not _base_avisada:
+                    print(f"[INFO] Base local da Receita não encontrada em {base.caminho}. Usando cache e API.")
+                    _base_avisada = True
+                return None
+            _base = base
+    return _base
+
+# ---------------------------------------------------------------- importação
+
+def _arquivos(origem, marcador):
+    """(nome, arquivo texto) de cada CSV da Receita cujo nome contém `marcador`, dentro ou fora de .zip."""
+    caminhos = [origem] if os.path.isfile(origem) else sorted(
+        os.path.join(origem, nome) for nome in os.listdir(origem)
+    )
+    for caminho in caminhos:
+        if zipfile.is_zipfile(caminho):
+            with zipfile.ZipFile(caminho) as pacote:
+                for membro in pacote.namelist():
+                    if marcador in membro.upper():
+                        with pacote.open(membro) as bruto:
+                            yield membro, io.TextIOWrapper(bruto, encoding='latin-1', newline='')
+        elif marcador in os.path.basename(caminho).upper():
+            with open(caminho, encoding='latin-1', newline='') as arquivo:
+                yield os.path.basename(caminho), arquivo
+
+def _lerCnpjs(caminho):
+    with open(caminho, encoding='utf-8') as arquivo:
+        return {int(d) for d in (''.join(filter(str.isdigit, linha)) for linha in arquivo) if len(d) == 14}
+
+def _gravarEmLotes(conexao, sql, linhas):
+    total = 0
+    lote = []
+    for linha in linhas:
+        lote.append(linha)
+        if len(lote) >= _LOTE_IMPORTACAO:
+            conexao.executemany(sql, lote)
+            total += len(lote)
+            lote.clear()
+    if lote:
+        conexao.executemany(sql, lote)
+        total += len(lote)
+    return total
+
+def importar(origem, destino=None, ufs=None, cnpjs=None):
+    """
+    Monta a base a partir da pasta (ou arquivo) `origem` com os dados abertos.
+    `ufs` e `cnpjs` restringem os estabelecimentos importados; nesse caso o Simples
+    é carregado inteiro e depois podado, no SQLite, às raízes de CNPJ importadas
+    (sem guardar as raízes em memória). A base é montada num arquivo temporário e
+    só substitui a anterior no final.
+    """
+    destino = destino or caminhoPadrao()
+    temporario = destino + '.importando'
+    if os.path.exists(temporario):
+        os.remove(temporario)
+    ufs = {uf.upper() for uf in ufs} if ufs else None
+    inicio = time.perf_counter()
+
+    conexao = sqlite3.connect(temporario)
+    try:
+        conexao.execute("PRAGMA journal_mode=OFF")
+        conexao.execute("PRAGMA synchronous=OFF")
+        conexao.execute("CREATE TABLE estabelecimento (cnpj INTEGER PRIMARY KEY, cnae TEXT, uf TEXT) WITHOUT ROWID")
+        conexao.execute("CREATE TABLE simples (cnpj_basico INTEGER PRIMARY KEY, simples INTEGER NOT NULL) WITHOUT ROWID")
+        conexao.execute("CREATE TABLE importacao (chave TEXT PRIMARY KEY, valor TEXT)")
+
+        def estabelecimentos(arquivo):
+            for campos in csv.reader(arquivo, delimiter=';'):
+                if len(campos) <= _EST_UF:
+                    continue
+                uf = campos[_EST_UF].strip().upper()
+                if ufs and uf not in ufs:
+                    continue
+                try:
+                    numero = int(campos[_EST_BASICO] + campos[_EST_ORDEM] + campos[_EST_DV])
+                except ValueError:
+                    continue
+                if cnpjs is not None and numero not in cnpjs:
+                    continue
+                yield numero, campos[_EST_CNAE].strip(), uf
+
+        total_est = 0
+        for nome, arquivo in _arquivos(origem, 'ESTABELE'):
+            gravados = _gravarEmLotes(conexao, "INSERT OR REPLACE INTO estabelecimento VALUES (?, ?, ?)",
+                                      estabelecimentos(arquivo))
+            total_est += gravados
+            print(f"[INFO] {nome}: {gravados} estabelecimentos.")
+        if not total_est:
+            raise ValueError(f"Nenhum estabelecimento importado de {origem}.")
+
+        def optantes(arquivo):
+            for campos in csv.reader(arquivo, delimiter=';'):
+                if len(campos) <= _SIMPLES_OPCAO:
+                    continue
+                try:
+                    basico = int(campos[_SIMPLES_BASICO])
+                except ValueError:
+                    continue
+                yield basico, 1 if campos[_SIMPLES_OPCAO].strip().upper() == 'S' else 0
+
+        total_simples = 0
+        for nome, arquivo in _arquivos(origem, 'SIMPLES'):
+            gravados = _gravarEmLotes(conexao, "INSERT OR REPLACE INTO simples VALUES (?, ?)", optantes(arquivo))
+            total_simples += gravados
+            print(f"[INFO] {nome}: {gravados} registros do Simples.")
+
+        if ufs or cnpjs is not None:
+            conexao.execute("""
+                DELETE FROM simples
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM estabelecimento e
+                    WHERE e.cnpj BETWEEN simples.cnpj_basico * 1000000 AND simples.cnpj_basico * 1000000 + 999999
+                )
+            """)
+        total_simples = conexao.execute("SELECT COUNT(*) FROM simples").fetchone()[0]
+
+        conexao.executemany("INSERT INTO importacao VALUES (?, ?)", [
+            ('origem', os.path.abspath(origem)),
+            ('importado_em', time.strftime('%Y-%m-%d %H:%M:%S')),
+            ('ufs', ','.join(sorted(ufs)) if ufs else '*'),
+        ])
+        conexao.commit()
+        conexao.execute("VACUUM")
+    except Exception:
+        conexao.close()
+        os.remove(temporario)
+        raise
+    conexao.close()
+
+    os.replace(temporario, destino)
+    print(f"[OK] Base da Receita gravada em {destino} em {time.perf_counter() - inicio:.1f}s: "
+          f"{total_est} estabelecimentos, {total_simples} registros do Simples.")
+    return total_est
+
+def main():
+    parser = argparse.ArgumentParser(description="Base local de CNPJs a partir dos dados abertos da Receita Federal.")
+    comandos = parser.add_subparsers(dest='comando', required=True)
+    imp = comandos.add_parser('importar', help="importa os arquivos Estabelecimentos*.zip e Simples.zip")
+    imp.add_argument('origem', help="pasta com os .zip (ou os CSVs extraídos)")
+    imp.add_argument('--destino', help="arquivo SQLite de saída (padrão: RECEITA_BASE_ARQUIVO ou a pasta de dados)")
+    imp.add_argument('--uf', action='append', help="importa só estas UFs (pode repetir)")
+    imp.add_argument('--cnpjs', help="arquivo com os CNPJs a importar, um por linha")
+    con = comandos.add_parser('consultar', help="consulta CNPJs na base local")
+    con.add_argument('cnpj', nargs='+')
+    args = parser.parse_args()
+
+    if args.comando == 'importar':
+        importar(args.origem, args.destino, args.uf, _lerCnpjs(args.cnpjs) if args.cnpjs else None)
+    else:
+        base = BaseReceita()
+        inicio = time.perf_counter()
+        encontrados = base.get_many([''.join(filter(str.isdigit, c)) for c in args.cnpj])
+        print(f"{len(encontrados)} de {len(args.cnpj)} encontrados em {(time.perf_counter() - inicio) * 1000:.1f} ms")
+        for cnpj, dados in encontrados.items():
+            print(cnpj, *dados)
+
+if __name__ == '__main__':
+    main()
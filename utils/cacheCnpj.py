@@ -0,0 +1,107 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from utils.configuracao import diretorioDados, obterConfig, obterConfigInt
+
+# Cache em disco (SQLite) das consultas de CNPJ, compartilhado entre execuções.
+# Guarda o dado bruto (cnae, uf, simples); o "decreto" depende da lista de CNAEs
+# e é recalculado na leitura. CNPJs inválidos ou não encontrados ficam como
+# negativos, com validade própria, para não voltarem à rede a cada carga.
+CNPJ_CACHE_TTL_DIAS = obterConfigInt('CNPJ_CACHE_TTL_DIAS', 30)
+CNPJ_CACHE_TTL_NEGATIVO_DIAS = obterConfigInt('CNPJ_CACHE_TTL_NEGATIVO_DIAS', 7)
+
+# Limite de parâmetros por consulta do SQLite (999 nas versões antigas)
+_LOTE_SQLITE = 500
+
+class CacheCnpj:
+    def __init__(self, caminho=None, ttl=None, ttl_negativo=None):
+        self.caminho = caminho or obterConfig('CNPJ_CACHE_ARQUIVO') or os.path.join(diretorioDados(), 'cache_cnpj.sqlite3')
+        self.ttl = (CNPJ_CACHE_TTL_DIAS if ttl is None else ttl) * 86400
+        self.ttl_negativo = (CNPJ_CACHE_TTL_NEGATIVO_DIAS if ttl_negativo is None else ttl_negativo) * 86400
+        self._trava = threading.Lock()
+        with self._conectar() as conexao:
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.execute("""
+                CREATE TABLE IF NOT EXISTS cnpj (
+                    cnpj TEXT PRIMARY KEY,
+                    cnae TEXT,
+                    uf TEXT,
+                    simples TEXT,
+                    negativo INTEGER NOT NULL DEFAULT 0,
+                    motivo TEXT,
+                    atualizado_em REAL NOT NULL
+                )
+            """)
+
+    @contextmanager
+    def _conectar(self):
+        conexao = sqlite3.connect(self.caminho, timeout=30)
+        try:
+            with conexao:
+                yield conexao
+        finally:
+            conexao.close()
+
+    def get_many(self, cnpjs, motivos=None):
+        """
+        {cnpj: (cnae, uf, simples)} para os válidos em cache e {cnpj: None} para os
+        negativos; CNPJs ausentes ou vencidos não aparecem no retorno.
+        Se `motivos` (dict) for informado, recebe {cnpj: motivo} dos negativos.
+        """
+        cnpjs = list(dict.fromkeys(cnpjs))
+        agora = time.time()
+        encontrados = {}
+        with self._conectar() as conexao:
+            for i in range(0, len(cnpjs), _LOTE_SQLITE):
+                lote = cnpjs[i:i + _LOTE_SQLITE]
+                marcadores = ', '.join(['?'] * len(lote))
+                linhas = conexao.execute(f"""
+                    SELECT cnpj, cnae, uf, simples, negativo, motivo, atualizado_em
+                    FROM cnpj WHERE cnpj IN ({marcadores})
+                """, lote)
+                for cnpj, cnae, uf, simples, negativo, motivo, atualizado_em in linhas:
+                    validade = self.ttl_negativo if negativo else self.ttl
+                    if agora - atualizado_em > validade:
+                        continue
+                    encontrados[cnpj] = None if negativo else (cnae, uf, simples)
+                    if negativo and motivos is not None:
+                        motivos[cnpj] = motivo or 'negativo'
+        return encontrados
+
+    def put_many(self, dados, motivo=None):
+        """Grava {cnpj: (cnae, uf, simples)}; valor None grava o CNPJ como negativo (com `motivo`)."""
+        if not dados:
+            return
+        agora = time.time()
+        linhas = [
+            (cnpj, None, None, None, 1, motivo, agora) if valor is None
+            else (cnpj, valor[0], valor[1], valor[2], 0, None, agora)
+            for cnpj, valor in dados.items()
+        ]
+        with self._trava, self._conectar() as conexao:
+            conexao.executemany("""
+                INSERT OR REPLACE INTO cnpj (cnpj, cnae, uf, simples, negativo, motivo, atualizado_em)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, linhas)
+
+    def limpar_expirados(self):
+        agora = time.time()
+        with self._trava, self._conectar() as conexao:
+            removidos = conexao.execute("""
+                DELETE FROM cnpj
+                WHERE (negativo = 0 AND atualizado_em < ?) OR (negativo = 1 AND atualizado_em < ?)
+            """, (agora - self.ttl, agora - self.ttl_negativo)).rowcount
+        return removidos
+
+_cache = None
+_cache_trava = threading.Lock()
+
+def obterCacheCnpj():
+    global _cache
+    if _cache is None:
+        with _cache_trava:
+            if _cache is None:
+                _cache = CacheCnpj()
+    return _cache
@@ -1,25 +1,18 @@
 import aiohttp
 import asyncio
 import re
-from functools import wraps
-from time import time
-
-def create_cache(ttl=3600):
-    cache_dict = {}
-    def decorator(func):
-        @wraps(func)
-        async def wrapper(*args, **kwargs):
-            key = str((args, frozenset(kwargs.items())))
-            now = time()
-            if key in cache_dict:
-                cached_time, result = cache_dict[key]
-                if now - cached_time <= ttl:
-                    return result
-            result = await func(*args, **kwargs)
-            cache_dict[key] = (time(), result)
-            return result
-        return wrapper
-    return decorator
+import sqlite3
+import time
+from utils.baseReceita import obterBaseReceita
+from utils.cacheCnpj import obterCacheCnpj
+from utils.configuracao import obterConfig, obterConfigInt
+from utils.limitador import LimitadorAdaptativo, esperaComJitter, lerRetryAfter
+
+CNPJ_API_URL = obterConfig('CNPJ_API_URL', 'https://minhareceita.org').rstrip('/')
+CNPJ_CONCORRENCIA = obterConfigInt('CNPJ_CONCORRENCIA', 10)
+CNPJ_TENTATIVAS = obterConfigInt('CNPJ_TENTATIVAS', 6)
+CNPJ_TAXA_INICIAL = obterConfigInt('CNPJ_TAXA_INICIAL', 5)
+CNPJ_TAXA_MAXIMA = obterConfigInt('CNPJ_TAXA_MAXIMA', 20)
 
 
 def remover_caracteres_nao_numericos(valor: str) -> str:
@@ -35,72 +28,224 @@ lista_cnaes = [
     '4772500', '4763601'
 ]
 
-cache_resultados = {}
-semaforo = asyncio.Semaphore(5)
-
-
-@create_cache()
-async def buscar_informacoes(cnpj: str, semaforo, tentativas: int = 6) -> tuple:
-    url = f'https://minhareceita.org/{cnpj}'
-    timeout = aiohttp.ClientTimeout(total=30)
-
-    async with semaforo:
-        for tentativa in range(1, tentativas + 1):
-            try:
-                async with aiohttp.ClientSession(timeout=timeout) as session:
-                    async with session.get(url) as resposta:
-                        if resposta.status == 200:
-                            dados = await resposta.json()
-                            cnae_codigo = str(dados.get('cnae_fiscal', ''))
-                            existe_na_lista = "Sim" if cnae_codigo in lista_cnaes else "Não"
-                            uf = dados.get('uf', '')
-                            simples = "Sim" if dados.get('opcao_pelo_simples') else "Não"
-                            return cnae_codigo, existe_na_lista, uf, simples
-                        else:
-                            print(f"[{tentativa}] Erro {resposta.status} para CNPJ {cnpj}")
-            except asyncio.TimeoutError:
-                print(f"[{tentativa}] Timeout no CNPJ {cnpj}")
-            except Exception as e:
-                print(f"[{tentativa}] Erro inesperado no CNPJ {cnpj}: {e}")
-            await asyncio.sleep(2 ** tentativa)
+# Resposta definitiva da API de que o CNPJ não existe (vai para o cache negativo)
+NAO_ENCONTRADO = 'nao_encontrado'
+
+
+def montar_resultado(cnae_codigo, uf, simples) -> tuple:
+    existe_na_lista = "Sim" if cnae_codigo in lista_cnaes else "Não"
+    return cnae_codigo, existe_na_lista, uf, simples
+
+
+class EstatisticasCnpj:
+    """Contadores de uma rodada de consultas; por_segundo() dá as consultas/s medidas."""
+    def __init__(self):
+        self.consultas = 0
+        self.encontrados = 0
+        self.nao_encontrados = 0
+        self.falhas = 0
+        self.requisicoes = 0
+        self.limitadas = 0
+        self.erros_servidor = 0
+        self.inicio = time.perf_counter()
+        self.fim = None
+
+    def duracao(self):
+        return (self.fim or time.perf_counter()) - self.inicio
+
+    def por_segundo(self):
+        duracao = self.duracao()
+        return self.consultas / duracao if duracao > 0 else 0.0
+
+    def __repr__(self):
+        return (f"{self.consultas} consultas em {self.duracao():.2f}s ({self.por_segundo():.1f}/s): "
+                f"{self.encontrados} encontrados, {self.nao_encontrados} não encontrados, {self.falhas} falhas; "
+                f"{self.requisicoes} requisições, {self.limitadas} respostas 429, {self.erros_servidor} erros 5xx")
+
+ultima_estatistica = None
 
+
+def estatisticasCnpj():
+    """Estatísticas da última rodada de consultas à API (None se ainda não houve)."""
+    return ultima_estatistica
+
+
+def novaSessao():
+    conector = aiohttp.TCPConnector(limit=CNPJ_CONCORRENCIA, ttl_dns_cache=300, keepalive_timeout=30)
+    return aiohttp.ClientSession(connector=conector, timeout=aiohttp.ClientTimeout(total=30))
+
+
+async def buscar_informacoes(cnpj: str, sessao, limitador, estatisticas, tentativas: int = CNPJ_TENTATIVAS):
+    """(cnae, uf, simples), NAO_ENCONTRADO para 400/404 ou None se as tentativas acabarem."""
+    url = f'{CNPJ_API_URL}/{cnpj}'
+    estatisticas.consultas += 1
+
+    for tentativa in range(1, tentativas + 1):
+        await limitador.adquirir()
+        estatisticas.requisicoes += 1
+        try:
+            async with sessao.get(url) as resposta:
+                if resposta.status == 200:
+                    dados = await resposta.json()
+                    limitador.sucesso()
+                    estatisticas.encontrados += 1
+                    cnae_codigo = str(dados.get('cnae_fiscal', ''))
+                    uf = dados.get('uf', '')
+                    simples = "Sim" if dados.get('opcao_pelo_simples') else "Não"
+                    return cnae_codigo, uf, simples
+                elif resposta.status in (400, 404):
+                    limitador.sucesso()
+                    estatisticas.nao_encontrados += 1
+                    print(f"[{tentativa}] CNPJ {cnpj} não encontrado ({resposta.status})")
+                    return NAO_ENCONTRADO
+                elif resposta.status == 429 or resposta.status >= 500:
+                    if resposta.status == 429:
+                        estatisticas.limitadas += 1
+                    else:
+                        estatisticas.erros_servidor += 1
+                    limitador.reduzir(lerRetryAfter(resposta.headers.get('Retry-After')))
+                    print(f"[{tentativa}] Erro {resposta.status} para CNPJ {cnpj}; taxa reduzida para {limitador.taxa:.1f}/s")
+                else:
+                    print(f"[{tentativa}] Erro {resposta.status} para CNPJ {cnpj}")
+        except asyncio.TimeoutError:
+            print(f"[{tentativa}] Timeout no CNPJ {cnpj}")
+        except aiohttp.ClientError as e:
+            print(f"[{tentativa}] Erro de conexão no CNPJ {cnpj}: {e}")
+        except Exception as e:
+            print(f"[{tentativa}] Erro inesperado no CNPJ {cnpj}: {e}")
+        if tentativa < tentativas:
+            await asyncio.sleep(esperaComJitter(tentativa))
+
+    estatisticas.falhas += 1
     print(f"[FALHA] Tentativas esgotadas para o CNPJ {cnpj}")
-    return None, None, None, None
+    return None
 
 
-async def _processar_cnpj(cnpj: str, resultados: dict, semaforo):
-    cnpj_limpo = remover_caracteres_nao_numericos(cnpj)
+async def _processar_cnpj(cnpj: str, sessao, limitador, estatisticas, novos: dict, negativos: dict):
+    dados = await buscar_informacoes(cnpj, sessao, limitador, estatisticas)
 
-    if not validar_cnpj(cnpj_limpo):
-        print(f"[IGNORADO] CNPJ inválido: {cnpj}")
+    if dados is None:
+        return
+    if dados == NAO_ENCONTRADO:
+        negativos[cnpj] = NAO_ENCONTRADO
         return
 
-    cnae_codigo, existe_na_lista, uf, simples = await buscar_informacoes(cnpj_limpo, semaforo)
-
-    if all([cnae_codigo, existe_na_lista, uf]):
-        resultados[cnpj] = (cnae_codigo, existe_na_lista, uf, simples)
-        cache_resultados[cnpj] = resultados[cnpj]
+    cnae_codigo, uf, simples = dados
+    if cnae_codigo and uf:
+        novos[cnpj] = dados
     else:
         print(f"[ERRO] Dados incompletos para o CNPJ {cnpj}. Ignorado.")
+        negativos[cnpj] = 'incompleto'
+
+
+async def consultar_api(cnpjs, novos: dict, negativos: dict):
+    """Consulta os CNPJs numa única sessão (conexões reaproveitadas) sob o limitador adaptativo."""
+    global ultima_estatistica
+    estatisticas = EstatisticasCnpj()
+    limitador = LimitadorAdaptativo(CNPJ_TAXA_INICIAL, taxa_maxima=CNPJ_TAXA_MAXIMA)
+    semaforo = asyncio.Semaphore(CNPJ_CONCORRENCIA)
+
+    async def consultar(cnpj):
+        async with semaforo:
+            await _processar_cnpj(cnpj, sessao, limitador, estatisticas, novos, negativos)
+
+    async with novaSessao() as sessao:
+        await asyncio.gather(*(consultar(cnpj) for cnpj in cnpjs))
+
+    estatisticas.fim = time.perf_counter()
+    ultima_estatistica = estatisticas
+    print(f"[API] {estatisticas}")
+    return estatisticas
+
+
+def _consultarBaseLocal(cnpjs):
+    base = obterBaseReceita()
+    if base is None:
+        return {}
+    try:
+        inicio = time.perf_counter()
+        encontrados = base.get_many(cnpjs)
+        print(f"[BASE] {len(encontrados)} de {len(cnpjs)} CNPJs na base local da Receita "
+              f"({(time.perf_counter() - inicio) * 1000:.0f} ms).")
+        return encontrados
+    except sqlite3.Error as e:
+        print(f"[AVISO] Falha ao consultar a base local da Receita: {e}")
+        return {}
+
 
+def _abrirCache():
+    try:
+        return obterCacheCnpj()
+    except (sqlite3.Error, OSError) as e:
+        print(f"[AVISO] Cache de CNPJ indisponível, consultando só a API: {e}")
+        return None
 
-async def processar_cnpjs(cnpjs: list[str]) -> dict:
+
+async def processar_cnpjs(cnpjs: list[str], falhas: set = None, usar_cache: bool = True, negativos: dict = None) -> dict:
+    """
+    {cnpj: (cnae, decreto, uf, simples)}. Consulta primeiro a base local da Receita
+    (utils.baseReceita), depois o cache em disco, e só vai à API para os CNPJs
+    ausentes ou vencidos; as respostas da API voltam ao cache.
+    Se `falhas` (set) for informado, recebe os CNPJs cuja consulta falhou e deve
+    ser repetida (inválidos e não encontrados não entram).
+    Se `negativos` (dict) for informado, recebe {cnpj: motivo} dos CNPJs que não têm
+    dados: inválidos, não encontrados ou incompletos, da API ou do cache negativo.
+    usar_cache=False ignora a base local e o cache e consulta tudo na API.
+    """
     resultados = {}
-    tasks = []
-    semaforo = asyncio.Semaphore(5)
-
-    for cnpj in cnpjs:
-        if cnpj in cache_resultados:
-            resultado = cache_resultados[cnpj]
-            if all(resultado):
-                resultados[cnpj] = resultado
-            else:
-                print(f"[CACHE ERRO] Cache inválido para {cnpj}. Ignorando.")
-        else:
-            tasks.append(_processar_cnpj(cnpj, resultados, semaforo))
-
-    if tasks:
-        await asyncio.gather(*tasks)
+    limpos = {cnpj: remover_caracteres_nao_numericos(cnpj) for cnpj in cnpjs}
+
+    na_base = _consultarBaseLocal(set(limpos.values())) if usar_cache else {}
+    for cnpj, cnpj_limpo in list(limpos.items()):
+        if cnpj_limpo in na_base:
+            resultados[cnpj] = montar_resultado(*na_base[cnpj_limpo])
+            del limpos[cnpj]
+
+    cache = _abrirCache() if usar_cache and limpos else None
+    em_cache = {}
+    motivos_cache = {}
+    if cache:
+        try:
+            em_cache = cache.get_many(limpos.values(), motivos_cache)
+        except sqlite3.Error as e:
+            print(f"[AVISO] Falha ao ler o cache de CNPJ: {e}")
+
+    consultar = set()
+    sem_dados = dict(motivos_cache)
+    for cnpj, cnpj_limpo in limpos.items():
+        if cnpj_limpo in em_cache:
+            if em_cache[cnpj_limpo] is not None:
+                resultados[cnpj] = montar_resultado(*em_cache[cnpj_limpo])
+            continue
+        if not validar_cnpj(cnpj_limpo):
+            print(f"[IGNORADO] CNPJ inválido: {cnpj}")
+            sem_dados[cnpj_limpo] = 'invalido'
+            continue
+        consultar.add(cnpj_limpo)
+
+    print(f"[CACHE] {len(em_cache)} CNPJs no cache local, {len(consultar)} consultas à API.")
+
+    novos = {}
+    if consultar:
+        await consultar_api(consultar, novos, sem_dados)
+
+    if cache:
+        try:
+            cache.put_many(novos)
+            respondidos = {c: m for c, m in sem_dados.items() if c not in motivos_cache}
+            for motivo in set(respondidos.values()):
+                cache.put_many({c: None for c, m in respondidos.items() if m == motivo}, motivo)
+        except sqlite3.Error as e:
+            print(f"[AVISO] Falha ao gravar o cache de CNPJ: {e}")
+
+    for cnpj, cnpj_limpo in limpos.items():
+        if cnpj_limpo in novos:
+            resultados[cnpj] = montar_resultado(*novos[cnpj_limpo])
+        elif cnpj_limpo in sem_dados:
+            if negativos is not None:
+                negativos[cnpj] = sem_dados[cnpj_limpo]
+        elif falhas is not None and cnpj_limpo in consultar:
+            falhas.add(cnpj)
 
     return resultados
 
@@ -129,7 +274,7 @@ async def consultar_cnpj_api_async(cnpj: str) -> dict:
     if len(cnpj) != 14:
         raise ValueError("CNPJ inválido.")
 
-    url = f'https://minhareceita.org/{cnpj}'
+    url = f'{CNPJ_API_URL}/{cnpj}'
     timeout = aiohttp.ClientTimeout(total=15)
 
     async with aiohttp.ClientSession(timeout=timeout) as session:
@@ -0,0 +1,46 @@
+import os
+import sys
+from dotenv import load_dotenv
+
+_env_carregado = False
+
+def carregarEnv():
+    global _env_carregado
+    if _env_carregado:
+        return
+    envDiretorio = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
+    load_dotenv(dotenv_path=envDiretorio, override=True)
+    _env_carregado = True
+
+def obterConfig(chave, padrao=None):
+    carregarEnv()
+    valor = os.getenv(chave)
+    return padrao if valor is None or valor.strip() == '' else valor.strip()
+
+def obterConfigInt(chave, padrao):
+    try:
+        return int(obterConfig(chave, padrao))
+    except (TypeError, ValueError):
+        print(f"[AVISO] Valor inválido para {chave}. Usando {padrao}.")
+        return padrao
+
+def obterConfigBool(chave, padrao=False):
+    valor = obterConfig(chave)
+    if valor is None:
+        return padrao
+    return valor.lower() in ('1', 'true', 'sim', 's', 'yes', 'on')
+
+def diretorioDados():
+    """Pasta de dados locais do usuário (DIRETORIO_DADOS no .env tem prioridade); é criada se não existir."""
+    diretorio = obterConfig('DIRETORIO_DADOS')
+    if not diretorio:
+        if os.name == 'nt':
+            base = os.getenv('LOCALAPPDATA') or os.getenv('APPDATA') or os.path.expanduser('~')
+            diretorio = os.path.join(base, 'ApuradorICMS')
+        elif sys.platform == 'darwin':
+            diretorio = os.path.join(os.path.expanduser('~'), 'Library', 'Application Support', 'ApuradorICMS')
+        else:
+            base = os.getenv('XDG_DATA_HOME') or os.path.join(os.path.expanduser('~'), '.local', 'share')
+            diretorio = os.path.join(base, 'apuradorICMS')
+    os.makedirs(diretorio, exist_ok=True)
+    return diretorio
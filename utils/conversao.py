@@ -19,3 +19,23 @@ def Conversor(valor_str):
 
     except (ValueError, TypeError):
         return 0.0
+
+# Espelho em SQL (MySQL 8) do Conversor, para cálculos em conjunto no banco.
+# Mesmo fluxo: remove tudo que não for dígito, ponto ou vírgula; com vírgula, o ponto
+# é separador de milhar; texto que o float() do Python rejeitaria vale 0.
+# O arredondamento para 4 casas só coincide com o Python quando a entrada tem até
+# 4 decimais; use sqlMaisDe4Decimais para separar os demais casos.
+REGEX_NUMERO_SQL = '^([0-9]+[.]?[0-9]*|[.][0-9]+)$'
+
+def sqlLimpo(coluna):
+    return f"REGEXP_REPLACE(IFNULL({coluna}, ''), '[^0-9.,]', '')"
+
+def sqlNormalizado(limpo):
+    return f"IF(LOCATE(',', {limpo}) > 0, REPLACE(REPLACE({limpo}, '.', ''), ',', '.'), {limpo})"
+
+def sqlConversor(limpo):
+    texto = sqlNormalizado(limpo)
+    return f"IF({texto} REGEXP '{REGEX_NUMERO_SQL}', CAST({texto} AS DECIMAL(30, 4)), 0)"
+
+def sqlMaisDe4Decimais(limpo):
+    return f"({sqlNormalizado(limpo)} REGEXP '[.][0-9]{{5,}}')"
@@ -0,0 +1,60 @@
+import asyncio
+import random
+import time
+
+class LimitadorAdaptativo:
+    """
+    Token bucket com taxa adaptativa (AIMD): cada resposta boa sobe a taxa em
+    `incremento` req/s até `taxa_maxima`; 429/5xx multiplicam a taxa por
+    `fator_reducao` (no máximo uma vez por `janela_reducao` segundos) e respeitam
+    o Retry-After.
+    O balde guarda no máximo 1 segundo de fichas, então não há rajadas.
+    """
+    def __init__(self, taxa=5.0, taxa_minima=0.5, taxa_maxima=20.0, incremento=0.2, fator_reducao=0.5, janela_reducao=1.0):
+        self.taxa = float(taxa)
+        self.taxa_minima = float(taxa_minima)
+        self.taxa_maxima = float(taxa_maxima)
+        self.incremento = incremento
+        self.fator_reducao = fator_reducao
+        self.janela_reducao = janela_reducao
+        self.fichas = 1.0
+        self._ultimo = time.monotonic()
+        self._pausa_ate = 0.0
+        self._ultima_reducao = 0.0
+        self._trava = asyncio.Lock()
+
+    async def adquirir(self):
+        while True:
+            async with self._trava:
+                agora = time.monotonic()
+                self.fichas = min(max(1.0, self.taxa), self.fichas + (agora - self._ultimo) * self.taxa)
+                self._ultimo = agora
+                espera = self._pausa_ate - agora
+                if espera <= 0:
+                    if self.fichas >= 1:
+                        self.fichas -= 1
+                        return
+                    espera = (1 - self.fichas) / self.taxa
+            await asyncio.sleep(espera)
+
+    def sucesso(self):
+        self.taxa = min(self.taxa_maxima, self.taxa + self.incremento)
+
+    def reduzir(self, retry_after=None):
+        agora = time.monotonic()
+        if agora - self._ultima_reducao >= self.janela_reducao:
+            self.taxa = max(self.taxa_minima, self.taxa * self.fator_reducao)
+            self.fichas = 0.0
+            self._ultima_reducao = agora
+        if retry_after:
+            self._pausa_ate = max(self._pausa_ate, agora + retry_after)
+
+def esperaComJitter(tentativa, base=0.5, teto=8.0):
+    """Backoff exponencial com jitter completo: sorteio entre 0 e min(teto, base * 2^tentativa)."""
+    return random.uniform(0, min(teto, base * 2 ** tentativa))
+
+def lerRetryAfter(valor):
+    try:
+        return max(0.0, float(valor)) if valor else None
+    except ValueError:
+        return None
@@ -1,37 +1,96 @@
-def process_data(data: str) -> str:
-    linhas = data.strip().splitlines()
-    resultado = []
-    id_c100_atual = None
+import hashlib
 
-    for i, linha in enumerate(linhas):
+REGISTROS_LIDOS = {'0000', '0150', '0200', 'C100'}
+REGISTROS_FILHOS_C100 = {'C170', 'C190'}
+
+def lerRegistros(arquivo):
+    """
+    Lê o arquivo SPED linha a linha numa única passada e gera os campos de cada registro
+    relevante, na ordem do leiaute oficial. Cada C100 é gerado como um documento
+    ('C100', campos, filhos), com os C170/C190 que o seguem já agrupados em `filhos`,
+    então nenhuma linha é reescrita nem relida para ligar o item à nota.
+    Nenhuma cópia do arquivo inteiro é mantida em memória.
+    """
+    documento = None
+
+    for i, linha in enumerate(arquivo):
         linha = linha.strip()
 
         if not linha.startswith('|'):
             continue
 
         partes = linha.split('|')
-        if len(partes) < 2:
-            print(f"[WARN] Linha malformada ignorada na linha {i}: '{linha}'")
+        tipo_registro = partes[1]
+
+        if tipo_registro in REGISTROS_FILHOS_C100:
+            if documento is None:
+                print(f"[WARN] {tipo_registro} sem C100 relacionado na linha {i}")
+            else:
+                documento[2].append(tuple(partes[1:-1]))
             continue
 
-        tipo_registro = partes[1]
+        if tipo_registro not in REGISTROS_LIDOS:
+            continue
+
+        if documento is not None:
+            yield documento
+            documento = None
 
         if tipo_registro == 'C100':
-            id_c100_atual = partes[2] if len(partes) > 2 else None
-            resultado.append(linha)
+            documento = ('C100', tuple(partes[1:-1]), [])
+        else:
+            yield partes[1:-1]
 
-        elif tipo_registro == 'C170':
-            if id_c100_atual:
-                nova_linha = '|'.join(partes[:2] + [id_c100_atual] + partes[2:])
-                resultado.append(nova_linha)
-            else:
-                print(f"[WARN] C170 sem C100 relacionado na linha {i}")
-                resultado.append(linha)
+    if documento is not None:
+        yield documento
 
-        elif tipo_registro in ('0000', '0150', '0200'):
-            resultado.append(linha)
 
-        else:
-            pass
+def calcularHash(caminho, tamanho_bloco=1024 * 1024):
+    """SHA-256 do arquivo, lido em blocos para não carregá-lo inteiro."""
+    sha = hashlib.sha256()
+    with open(caminho, 'rb') as arquivo:
+        for bloco in iter(lambda: arquivo.read(tamanho_bloco), b''):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+
+# Filas dos arquivos no processo de leitura, entregues pelo initializer do pool
+# (multiprocessing.Queue só pode ser passada na criação do processo).
+_filas = None
+
+def iniciarLeitor(filas):
+    global _filas
+    _filas = filas
+
+def produzirLotesNaFila(caminho, indice, tamanho_lote=5000):
+    """produzirLotes na fila `indice` recebida por iniciarLeitor."""
+    return produzirLotes(caminho, _filas[indice], tamanho_lote)
+
+def produzirLotes(caminho, fila, tamanho_lote=5000):
+    """
+    Executada nos processos do pool de leitura: lê um arquivo SPED e publica os
+    registros em lotes de tuplas na fila limitada do arquivo. O put bloqueia quando
+    a fila está cheia, segurando a leitura até o escritor do banco consumir.
+    Ao final publica None; uma falha é publicada antes do None.
+    """
+    lote = []
+    total = 0
+
+    try:
+        with open(caminho, 'r', encoding='utf-8', errors='ignore') as arquivo:
+            for partes in lerRegistros(arquivo):
+                lote.append(tuple(partes))
+                if len(lote) >= tamanho_lote:
+                    fila.put(lote)
+                    total += len(lote)
+                    lote = []
 
-    return '\n'.join(resultado)
+        if lote:
+            fila.put(lote)
+            total += len(lote)
+        return total
+    except Exception as e:
+        fila.put(RuntimeError(f"Falha ao ler {caminho}: {e}"))
+        raise
+    finally:
+        fila.put(None)
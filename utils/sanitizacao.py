@@ -84,20 +84,6 @@ def corrigir_ind_mov(valor):
         return valor_str[:1]
     return valor_str
 
-def validar_estrutura_c170(dados):
-    try:
-        if not dados or len(dados) < 45:
-            return False
-        periodo = dados[0]
-        filial = dados[41]
-        num_doc = dados[43]
-        if not (periodo and filial and num_doc):
-            return False
-        return True
-    except Exception:
-        return False
-
-
 def sanitizar_campo(campo, valor):
     regras = {
         'cod_item': lambda v: truncar(v, 60),
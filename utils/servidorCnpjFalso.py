@@ -0,0 +1,94 @@
+import argparse
+import asyncio
+import random
+import time
+from aiohttp import web
+
+# Servidor local que imita a API de CNPJ (GET /{cnpj}) para medir o cliente sem
+# depender da rede: latência, respostas 429 (com Retry-After), erros 5xx, CNPJs
+# não encontrados e um limite de requisições por segundo configuráveis.
+#
+#   python -m utils.servidorCnpjFalso                       # só sobe o servidor
+#   python -m utils.servidorCnpjFalso --benchmark 500       # mede processar_cnpjs contra ele
+
+def gerarCnpj(rng):
+    base = [rng.randint(0, 9) for _ in range(12)]
+    for peso in ([5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2], [6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]):
+        digito = 11 - sum(d * p for d, p in zip(base, peso)) % 11
+        base.append(0 if digito > 9 else digito)
+    return ''.join(map(str, base))
+
+def criarApp(latencia=0.05, taxa_429=0.0, taxa_5xx=0.0, taxa_404=0.0, limite_por_segundo=0, retry_after=1):
+    janela = {'inicio': time.monotonic(), 'contagem': 0}
+
+    async def consultar(request):
+        await asyncio.sleep(latencia)
+        if limite_por_segundo:
+            agora = time.monotonic()
+            if agora - janela['inicio'] >= 1:
+                janela['inicio'], janela['contagem'] = agora, 0
+            janela['contagem'] += 1
+            if janela['contagem'] > limite_por_segundo:
+                return web.Response(status=429, headers={'Retry-After': str(retry_after)})
+
+        sorteio = random.random()
+        if sorteio < taxa_429:
+            return web.Response(status=429, headers={'Retry-After': str(retry_after)})
+        if sorteio < taxa_429 + taxa_5xx:
+            return web.Response(status=random.choice((500, 502, 503)))
+
+        cnpj = request.match_info['cnpj']
+        # Sorteio estável por CNPJ: o mesmo CNPJ é sempre encontrado ou não
+        rng = random.Random(cnpj)
+        if rng.random() < taxa_404:
+            return web.json_response({'message': 'CNPJ não encontrado'}, status=404)
+        return web.json_response({
+            'cnpj': cnpj,
+            'cnae_fiscal': rng.choice((4639701, 4711302, 4729699, 4930202, 5611201)),
+            'uf': rng.choice(('CE', 'CE', 'CE', 'PE', 'SP')),
+            'opcao_pelo_simples': rng.random() < 0.3,
+        })
+
+    app = web.Application()
+    app.router.add_get('/{cnpj}', consultar)
+    return app
+
+async def benchmark(quantidade, porta, **opcoes):
+    from utils import cnpj as modulo_cnpj
+
+    runner = web.AppRunner(criarApp(**opcoes))
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', porta).start()
+    modulo_cnpj.CNPJ_API_URL = f'http://127.0.0.1:{porta}'
+    try:
+        rng = random.Random(42)
+        cnpjs = [gerarCnpj(rng) for _ in range(quantidade)]
+        falhas = set()
+        resultados = await modulo_cnpj.processar_cnpjs(cnpjs, falhas, usar_cache=False)
+        estatisticas = modulo_cnpj.estatisticasCnpj()
+        print(f"[BENCHMARK] {len(resultados)} encontrados, {len(falhas)} falhas.")
+        print(f"[BENCHMARK] {estatisticas.por_segundo():.1f} consultas/s ({estatisticas})")
+    finally:
+        await runner.cleanup()
+
+def main():
+    parser = argparse.ArgumentParser(description="API de CNPJ falsa para testes de desempenho.")
+    parser.add_argument('--porta', type=int, default=8089)
+    parser.add_argument('--latencia', type=float, default=0.05, help="segundos por resposta")
+    parser.add_argument('--taxa-429', type=float, default=0.0)
+    parser.add_argument('--taxa-5xx', type=float, default=0.0)
+    parser.add_argument('--taxa-404', type=float, default=0.05)
+    parser.add_argument('--limite', type=int, default=0, help="requisições/s antes de responder 429 (0 = sem limite)")
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--benchmark', type=int, metavar='N', help="consulta N CNPJs gerados e mede as consultas/s")
+    args = parser.parse_args()
+
+    opcoes = dict(latencia=args.latencia, taxa_429=args.taxa_429, taxa_5xx=args.taxa_5xx,
+                  taxa_404=args.taxa_404, limite_por_segundo=args.limite, retry_after=args.retry_after)
+    if args.benchmark:
+        asyncio.run(benchmark(args.benchmark, args.porta, **opcoes))
+    else:
+        web.run_app(criarApp(**opcoes), host='127.0.0.1', port=args.porta)
+
+if __name__ == '__main__':
+    main()